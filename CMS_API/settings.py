@@ -54,6 +54,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'dashboard.middleware.SnapshotVersionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -102,6 +103,56 @@ DATABASES = {
 }
 
 
+# Cache
+# Holds the version stamps of the per-process snapshots (dashboard/cache.py),
+# so it must be shared by every worker process: a file based cache on a single
+# host, memcached / redis when the workers are spread across hosts.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache',
+    }
+}
+
+# List totals (dashboard/counts.py): an unfiltered list of a table above this many
+# rows gets the PostgreSQL table estimate instead of COUNT(*); totals are cached
+# this many seconds.
+COUNT_ESTIMATE_THRESHOLD = 100000
+COUNT_CACHE_TTL = 60
+
+# Audit trail (dashboard/audits.py): audits are queued after commit and written by a
+# background thread in bulk, every AUDIT_BATCH_SIZE records or AUDIT_FLUSH_INTERVAL
+# seconds. A full queue writes in the request; AUDIT_ASYNC = False always does.
+AUDIT_ASYNC = True
+AUDIT_QUEUE_SIZE = 10000
+AUDIT_BATCH_SIZE = 200
+AUDIT_FLUSH_INTERVAL = 1.0
+# every this many audits of an object store its full state, the rest only changes
+AUDIT_KEYFRAME_INTERVAL = 10
+
+# Audit retention (dashboard/audit_archive.py, `manage.py audit_retention`): months
+# older than AUDIT_RETENTION_MONTHS move to gzip JSONL files in AUDIT_ARCHIVE_DIR;
+# partitions are kept AUDIT_PARTITIONS_AHEAD months ahead on PostgreSQL.
+AUDIT_ARCHIVE_DIR = BASE_DIR / 'audit-archive'
+AUDIT_RETENTION_MONTHS = 12
+AUDIT_PARTITIONS_AHEAD = 3
+
+# Unity builds (dashboard/extraction.py): uploaded zips are extracted by
+# UNITY_EXTRACT_WORKERS background threads per process; a job with no progress for
+# UNITY_EXTRACT_STALE_AFTER seconds is taken over by another worker.
+UNITY_EXTRACT_WORKERS = 2
+UNITY_EXTRACT_STALE_AFTER = 300
+# each job unzips on UNITY_EXTRACT_THREADS threads and refuses zips with more members
+# or uncompressed bytes than these caps (zip bombs)
+UNITY_EXTRACT_THREADS = 4
+UNITY_EXTRACT_MAX_FILES = 20000
+UNITY_EXTRACT_MAX_BYTES = 4 * 1024 ** 3
+# builds are versioned under media/unity/builds; one no scene uses any more is deleted
+# this many seconds after it was replaced
+UNITY_BUILD_GRACE = 24 * 3600
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -140,6 +191,9 @@ STATIC_URL = 'static/'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# serve MEDIA_ROOT from Django (dashboard/media.py), with the Content-Encoding and
+# range support unity builds need; turn off when a web server serves /media/
+SERVE_MEDIA = True
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
@@ -1,8 +1,10 @@
 from django.contrib import admin
-from django.urls import path, include
+import re
+
+from django.urls import path, include, re_path
 from dashboard import views
+from dashboard.media import SERVE_MEDIA, serve_media
 from django.conf import settings
-from django.conf.urls.static import static
 
 urlpatterns = [
 
@@ -14,4 +16,10 @@ urlpatterns = [
     #REFRESH TOKEN 
     path('api/token/access', views.GetAccessTokenView.as_view(), name='refresh-token')
     
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
+
+if SERVE_MEDIA:
+    # precompressed unity builds need their encoding headers, see dashboard/media.py
+    urlpatterns += [
+        re_path(r'^{}(?P<path>.*)$'.format(re.escape(settings.MEDIA_URL.lstrip('/'))), serve_media, name='media'),
+    ]
@@ -14,3 +14,22 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'CMS_API.settings')
 
 application = get_wsgi_application()
+
+# build the search autocomplete index before the first request hits the worker
+from django.db import DatabaseError  # noqa: E402
+
+from dashboard.autocomplete import get_autocomplete_index  # noqa: E402
+from dashboard.extraction import resume_extractions  # noqa: E402
+
+try:
+    get_autocomplete_index()
+except DatabaseError:
+    # built on first use instead
+    pass
+
+# restart unity extractions left pending or stale by a previous process
+try:
+    resume_extractions()
+except DatabaseError:
+    # picked up when their status is polled instead
+    pass
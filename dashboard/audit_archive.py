@@ -0,0 +1,287 @@
+import datetime
+import gzip
+import itertools
+import json
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .counts import invalidate_counts
+from .models import AuditTrail
+
+# Audit retention.
+# On PostgreSQL dashboard_audittrail is range partitioned by month on created_at
+# (migration 0008): one dashboard_audittrail_pYYYYMM table per month plus a
+# default partition. archive_month() writes a month to a gzip JSONL file under
+# AUDIT_ARCHIVE_DIR, newest first, then detaches and drops its partition, so
+# expiring audits runs no DELETE and leaves nothing to vacuum on the hot table.
+# Other databases have no partitions and delete the archived rows instead.
+# Re-running a month whose drop failed rewrites its archive from the database
+# rows plus the archived ones not among them, so nothing is archived twice.
+# Run `manage.py audit_retention` daily to create upcoming partitions and
+# archive months older than AUDIT_RETENTION_MONTHS.
+
+AUDIT_TABLE = AuditTrail._meta.db_table
+AUDIT_ARCHIVE_DIR = getattr(settings, 'AUDIT_ARCHIVE_DIR', settings.BASE_DIR / 'audit-archive')
+AUDIT_RETENTION_MONTHS = getattr(settings, 'AUDIT_RETENTION_MONTHS', 12)
+AUDIT_PARTITIONS_AHEAD = getattr(settings, 'AUDIT_PARTITIONS_AHEAD', 3)
+
+ARCHIVE_FIELDS = (
+    'id', 'previous_id', 'user_id', 'model_type', 'object_id', 'object_str', 'action',
+    'ip', 'instance', 'previous_instance', 'changes', 'fields', 'created_at', 'updated_at',
+)
+PARTITION_RE = re.compile(r'^{}_p(\d{{4}})(\d{{2}})$'.format(AUDIT_TABLE))
+ARCHIVE_RE = re.compile(r'^audittrail-(\d{4})-(\d{2})\.jsonl\.gz$')
+
+
+class ArchiveError(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------------------------------------------
+# MONTHS
+# ---------------------------------------------------------------------------------------------------------
+def month_of(value):
+    value = value.astimezone(datetime.timezone.utc)
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month):
+    '''
+    returns the [start, end) datetimes of month, in UTC
+    '''
+    start = datetime.datetime(month.year, month.month, 1, tzinfo=datetime.timezone.utc)
+    following = add_months(month, 1)
+    return start, start.replace(year=following.year, month=following.month)
+
+
+def parse_month(value):
+    '''
+    parses YYYY-MM, raises ValueError
+    '''
+    return datetime.datetime.strptime(value, '%Y-%m').date()
+
+
+# ---------------------------------------------------------------------------------------------------------
+# PARTITIONS
+# ---------------------------------------------------------------------------------------------------------
+def partition_name(month):
+    return '{}_p{:%Y%m}'.format(AUDIT_TABLE, month)
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE oid = %s::regclass', [AUDIT_TABLE])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def get_partitions():
+    '''
+    returns the months that have a partition
+    '''
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = %s::regclass',
+            [AUDIT_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    months = []
+    for name in names:
+        match = PARTITION_RE.match(name)
+        if match:
+            months.append(datetime.date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def create_partition(month):
+    start, end = month_bounds(month)
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        # bounds are generated here, not user input
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM ('{}') TO ('{}')".format(
+                quote(partition_name(month)), quote(AUDIT_TABLE), start.isoformat(), end.isoformat())
+        )
+
+
+def ensure_partitions(ahead=AUDIT_PARTITIONS_AHEAD, now=None):
+    '''
+    creates the partitions of the current month and the ahead following ones
+    '''
+    if not is_partitioned():
+        return []
+    month = month_of(now or timezone.now())
+    months = [add_months(month, offset) for offset in range(ahead + 1)]
+    existing = set(get_partitions())
+    for month in months:
+        if month not in existing:
+            create_partition(month)
+    return [month for month in months if month not in existing]
+
+
+def drop_partition(month):
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute('ALTER TABLE {} DETACH PARTITION {}'.format(
+            quote(AUDIT_TABLE), quote(partition_name(month))))
+        cursor.execute('DROP TABLE {}'.format(quote(partition_name(month))))
+
+
+# ---------------------------------------------------------------------------------------------------------
+# ARCHIVES
+# ---------------------------------------------------------------------------------------------------------
+def archive_path(month):
+    return os.path.join(AUDIT_ARCHIVE_DIR, 'audittrail-{:%Y-%m}.jsonl.gz'.format(month))
+
+
+def is_archived(month):
+    return os.path.exists(archive_path(month))
+
+
+def get_archived_months():
+    '''
+    returns the archived months, newest first
+    '''
+    if not os.path.isdir(AUDIT_ARCHIVE_DIR):
+        return []
+    months = []
+    for name in os.listdir(AUDIT_ARCHIVE_DIR):
+        match = ARCHIVE_RE.match(name)
+        if match:
+            months.append(datetime.date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months, reverse=True)
+
+
+def archive_record(audit):
+    record = {name: getattr(audit, name) for name in ARCHIVE_FIELDS}
+    # the user may be gone by the time the archive is read
+    record['user'] = str(audit.user) if audit.user is not None else None
+    return record
+
+
+def verify_archive(path, expected):
+    '''
+    reads the archive at path back, ArchiveError unless it holds expected
+    records. gzip checks the crc of the whole file at its end
+    '''
+    try:
+        with gzip.open(path, 'rb') as lines:
+            count = sum(1 for _ in lines)
+    except (OSError, EOFError) as error:
+        raise ArchiveError('unreadable audit archive {}: {}'.format(path, error))
+    if count != expected:
+        raise ArchiveError('audit archive {} holds {} records, {} expected'.format(path, count, expected))
+
+
+def archive_month(month):
+    '''
+    moves the audits of month to its archive file and drops them from the
+    database. returns the number of audits archived
+    '''
+    start, end = month_bounds(month)
+    audits = (
+        AuditTrail.objects.filter(created_at__gte=start, created_at__lt=end)
+        .select_related('user').order_by('-created_at', '-id')
+    )
+    path = archive_path(month)
+    os.makedirs(AUDIT_ARCHIVE_DIR, exist_ok=True)
+
+    archived = set()
+    kept = 0
+    fd, temp_path = tempfile.mkstemp(dir=AUDIT_ARCHIVE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as out:
+                for audit in audits.iterator(chunk_size=2000):
+                    out.write(json.dumps(archive_record(audit), cls=DjangoJSONEncoder).encode())
+                    out.write(b'\n')
+                    archived.add(audit.id)
+                # keep what an earlier run archived, but not the rows it
+                # failed to drop, which were written again above
+                if os.path.exists(path):
+                    with gzip.open(path, 'rb') as previous:
+                        for line in previous:
+                            if json.loads(line)['id'] not in archived:
+                                out.write(line)
+                                kept += 1
+            raw.flush()
+            os.fsync(raw.fileno())
+        if archived:
+            verify_archive(temp_path, len(archived) + kept)
+            os.replace(temp_path, path)
+        else:
+            os.remove(temp_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    # only drop once the archive is safely on disk
+    with transaction.atomic():
+        if is_partitioned() and month in get_partitions():
+            drop_partition(month)
+        # rows of the month that landed in the default partition. one DELETE:
+        # the collector would load every id to run the delete signals, which
+        # only invalidate counts (done below), and nothing references audits
+        audits._raw_delete(audits.db)
+    invalidate_counts(AuditTrail)
+    return len(archived)
+
+
+def apply_retention(months=AUDIT_RETENTION_MONTHS, now=None):
+    '''
+    archives every month older than the latest months. returns [(month, count)]
+    '''
+    cutoff = add_months(month_of(now or timezone.now()), -months)
+    expired = set()
+    if is_partitioned():
+        expired.update(month for month in get_partitions() if month < cutoff)
+    oldest = AuditTrail.objects.aggregate(oldest=Min('created_at'))['oldest']
+    if oldest is not None:
+        month = month_of(oldest)
+        while month < cutoff:
+            expired.add(month)
+            month = add_months(month, 1)
+    return [(month, archive_month(month)) for month in sorted(expired)]
+
+
+class ArchivedMonth:
+    '''
+    the archived audits of month as dicts, newest first. supports len() and
+    slicing for LimitOffsetPagination, both read the file from the start
+    '''
+
+    def __init__(self, month):
+        self.path = archive_path(month)
+        self._count = None
+
+    def __iter__(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as lines:
+            for line in lines:
+                yield json.loads(line)
+
+    def __len__(self):
+        if self._count is None:
+            with gzip.open(self.path, 'rb') as lines:
+                self._count = sum(1 for _ in lines)
+        return self._count
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError('ArchivedMonth only supports slicing')
+        return list(itertools.islice(self, index.start, index.stop))
@@ -0,0 +1,146 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_datetime
+
+from .audit_archive import ArchivedMonth, get_archived_months, month_bounds
+from .models import AuditTrail
+
+# Audit export.
+# Rows are read with a server side cursor (QuerySet.iterator) and encoded one
+# at a time into the response, so memory stays flat however many rows match.
+# Live rows come first, newest first, then the archived months in the range,
+# also newest first (dashboard/audit_archive.py keeps them in that order).
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FIELDS = (
+    'id', 'created_at', 'user_id', 'user', 'model_type', 'object_id', 'object_str',
+    'action', 'ip', 'fields', 'changes',
+)
+
+_encoder = DjangoJSONEncoder()
+
+
+class AuditFilter:
+    '''
+    the date range (start inclusive, end exclusive), user id, model_type and
+    action an export is limited to, any of them None
+    '''
+
+    def __init__(self, start=None, end=None, user_id=None, model_type=None, action=None):
+        self.start = start
+        self.end = end
+        self.user_id = user_id
+        self.model_type = model_type
+        self.action = action
+
+    def queryset(self):
+        audits = AuditTrail.objects.all()
+        if self.start is not None:
+            audits = audits.filter(created_at__gte=self.start)
+        if self.end is not None:
+            audits = audits.filter(created_at__lt=self.end)
+        if self.user_id is not None:
+            audits = audits.filter(user_id=self.user_id)
+        if self.model_type is not None:
+            audits = audits.filter(model_type=self.model_type)
+        if self.action is not None:
+            audits = audits.filter(action=self.action)
+        return audits
+
+    def months(self):
+        '''
+        the archived months that overlap the range, newest first
+        '''
+        months = []
+        for month in get_archived_months():
+            month_start, month_end = month_bounds(month)
+            if self.start is not None and month_end <= self.start:
+                continue
+            if self.end is not None and month_start >= self.end:
+                continue
+            months.append(month)
+        return months
+
+    def matches(self, record):
+        if self.user_id is not None and record['user_id'] != self.user_id:
+            return False
+        if self.model_type is not None and record['model_type'] != self.model_type:
+            return False
+        if self.action is not None and record['action'] != self.action:
+            return False
+        if self.start is not None or self.end is not None:
+            created_at = parse_datetime(record['created_at'])
+            if self.start is not None and created_at < self.start:
+                return False
+            if self.end is not None and created_at >= self.end:
+                return False
+        return True
+
+
+def export_record(audit):
+    return {
+        'id': audit.id,
+        'created_at': _encoder.default(audit.created_at),
+        'user_id': audit.user_id,
+        'user': str(audit.user) if audit.user is not None else None,
+        'model_type': audit.model_type,
+        'object_id': audit.object_id,
+        'object_str': audit.object_str,
+        'action': audit.action,
+        'ip': audit.ip,
+        'fields': audit.fields,
+        'changes': audit.changes,
+    }
+
+
+def get_records(audit_filter):
+    '''
+    yields the matching audits as dicts of EXPORT_FIELDS
+    '''
+    audits = (
+        audit_filter.queryset()
+        .select_related('user')
+        # keyframe snapshots are not exported
+        .defer('instance', 'previous_instance')
+        .order_by('-created_at', '-id')
+    )
+    for audit in audits.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield export_record(audit)
+    for month in audit_filter.months():
+        for record in ArchivedMonth(month):
+            if audit_filter.matches(record):
+                yield {name: record.get(name) for name in EXPORT_FIELDS}
+
+
+class Echo:
+    '''
+    a file-like object csv.writer writes through, returning each line
+    '''
+    def write(self, value):
+        return value
+
+
+def stream_csv(records):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for record in records:
+        row = []
+        for name in EXPORT_FIELDS:
+            value = record[name]
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value, cls=DjangoJSONEncoder)
+            row.append('' if value is None else value)
+        yield writer.writerow(row)
+
+
+def stream_jsonl(records):
+    for record in records:
+        yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv', 'csv'),
+    'jsonl': (stream_jsonl, 'application/x-ndjson', 'jsonl'),
+}
@@ -0,0 +1,176 @@
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import AuditTrail
+
+# Audit snapshots.
+# An audit stores the audited object as native JSON, {field name: value} with
+# the values Django's json serializer would give. Only keyframes carry the full
+# state in `instance`; every audit with a previous one stores `changes`,
+# {field: [old, new]}, and the state of a non keyframe is rebuilt by applying
+# changes forward from the nearest keyframe behind it. An audit is a keyframe
+# when it starts its chain, when its previous audit is from an earlier month
+# (so each monthly partition rebuilds on its own, see dashboard.audit_archive),
+# or every AUDIT_KEYFRAME_INTERVAL audits.
+# Audits written before this format hold a serializers.serialize("json") string
+# in instance and are read as keyframes.
+
+AUDIT_KEYFRAME_INTERVAL = getattr(settings, 'AUDIT_KEYFRAME_INTERVAL', 10)
+
+_encoder = DjangoJSONEncoder()
+_snapshotters = {}
+
+
+# ---------------------------------------------------------------------------------------------------------
+# SNAPSHOTS
+# ---------------------------------------------------------------------------------------------------------
+def to_json(value):
+    if value is None or isinstance(value, (str, bool, int, float, list, dict)):
+        return value
+    return _encoder.default(value)
+
+
+def file_name(value):
+    return value.name or ''
+
+
+def get_snapshotter(model):
+    '''
+    returns [(name, attname, convert)] of model's concrete fields, built once per model
+    '''
+    fields = _snapshotters.get(model)
+    if fields is None:
+        fields = []
+        for field in model._meta.concrete_fields:
+            convert = file_name if isinstance(field, models.FileField) else to_json
+            fields.append((field.name, field.attname, convert))
+        _snapshotters[model] = fields
+    return fields
+
+
+def snapshot(instance):
+    '''
+    returns the state of instance as native JSON
+    '''
+    state = {}
+    for name, attname, convert in get_snapshotter(type(instance)):
+        state[name] = convert(getattr(instance, attname))
+    for field in instance._meta.many_to_many:
+        state[field.name] = list(getattr(instance, field.name).values_list('pk', flat=True))
+    return state
+
+
+def diff(old, new):
+    '''
+    returns {field: [old value, new value]} for the fields that differ
+    '''
+    changes = {}
+    for name in old.keys() | new.keys():
+        if old.get(name) != new.get(name):
+            changes[name] = [old.get(name), new.get(name)]
+    return changes
+
+
+def apply_changes(state, changes):
+    state = dict(state)
+    for name, (_, value) in changes.items():
+        state[name] = value
+    return state
+
+
+def legacy_state(value):
+    '''
+    reads an instance written by serializers.serialize("json", [instance])
+    '''
+    data = json.loads(value)[0]
+    return {'id': data['pk'], **data['fields']}
+
+
+# ---------------------------------------------------------------------------------------------------------
+# STATES
+# ---------------------------------------------------------------------------------------------------------
+def is_keyframe(audit):
+    return audit.instance is not None
+
+
+def get_recent_audits(keys, before=None):
+    '''
+    returns {(model_type, object_id): [audits, newest first]} holding the latest
+    AUDIT_KEYFRAME_INTERVAL audits of each key, with id below before if given.
+    one query over audit_object_history_idx
+    '''
+    if not keys:
+        return {}
+    condition = Q()
+    for model_type, object_id in keys:
+        condition |= Q(model_type=model_type, object_id=object_id)
+    audits = AuditTrail.objects.filter(condition)
+    if before is not None:
+        audits = audits.filter(id__lt=before)
+    audits = audits.annotate(position=Window(
+        RowNumber(),
+        partition_by=[F('model_type'), F('object_id')],
+        order_by=F('id').desc(),
+    )).filter(position__lte=AUDIT_KEYFRAME_INTERVAL).order_by('-id')
+
+    recent = {}
+    for audit in audits:
+        recent.setdefault((audit.model_type, audit.object_id), []).append(audit)
+    return recent
+
+
+class AuditStates:
+    '''
+    rebuilds the full state of audits. known holds audits already loaded, the
+    rest of a chain is fetched per object, AUDIT_KEYFRAME_INTERVAL audits at a time
+    '''
+
+    def __init__(self, known=()):
+        self.known = {audit.pk: audit for audit in known if audit.pk is not None}
+        self.states = {}
+
+    def add(self, audits):
+        for audit in audits:
+            if audit.pk is not None:
+                self.known.setdefault(audit.pk, audit)
+
+    def _previous(self, audit):
+        previous = self.known.get(audit.previous_id)
+        if previous is None:
+            recent = get_recent_audits([(audit.model_type, audit.object_id)], before=audit.pk)
+            self.add(recent.get((audit.model_type, audit.object_id), []))
+            previous = self.known.get(audit.previous_id)
+        return previous
+
+    def get(self, audit):
+        '''
+        returns (state, depth) of a stored audit, depth being the number of
+        audits since its keyframe; None when its keyframe is gone
+        '''
+        chain = []
+        while audit.pk not in self.states:
+            if is_keyframe(audit):
+                state = audit.instance
+                if isinstance(state, str):
+                    state = legacy_state(state)
+                self.states[audit.pk] = (state, 0)
+                break
+            chain.append(audit)
+            if audit.previous_id is None:
+                return None
+            audit = self._previous(audit)
+            if audit is None:
+                # archived, or written before the chain existed
+                return None
+
+        state, depth = self.states[audit.pk]
+        for audit in reversed(chain):
+            depth += 1
+            state = apply_changes(state, audit.changes or {})
+            self.states[audit.pk] = (state, depth)
+        return state, depth
@@ -0,0 +1,104 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class AuditWriter:
+    '''
+    Buffers records in an in-process queue and hands them to write(records)
+    from a background thread, in batches of up to batch_size or every
+    interval seconds. When the queue is full the caller writes synchronously.
+    The queue is drained when the process exits.
+    '''
+
+    def __init__(self, write, maxsize=10000, batch_size=200, interval=1.0):
+        self.write = write
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = queue.Queue(maxsize)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._registered = False
+
+    def put(self, record):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._write([record])
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # a forked worker must not write the records its parent queued
+                self._queue = queue.Queue(self.maxsize)
+                self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+            if not self._registered:
+                atexit.register(self.stop)
+                self._registered = True
+
+    def _take(self):
+        batch = []
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._take()
+            if batch:
+                self._write(batch)
+                close_old_connections()
+
+    def _write(self, records):
+        try:
+            self.write(records)
+        except Exception:
+            logger.exception('failed to write %d audit records', len(records))
+
+    def flush(self):
+        '''
+        writes everything queued so far in the calling thread
+        '''
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def stop(self):
+        self._stopping.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(self.interval + 5)
+        self.flush()
@@ -1,9 +1,24 @@
-from django.core import serializers
+import logging
+import threading
 
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from .audit_archive import month_of
+from .audit_snapshots import AUDIT_KEYFRAME_INTERVAL, AuditStates, diff, get_recent_audits, snapshot
+from .audit_writer import AuditWriter
+from .counts import invalidate_counts
 from .models import AuditTrail
 
+logger = logging.getLogger(__name__)
+
+# held while chains are linked, flush() and a full queue write outside the writer thread
+_chain_lock = threading.Lock()
+
 # AUDIT_CHOICES = {a[1]: a[0] for a in AUDIT_TYPE_CHOICES}
 
+
 def get_client_ip(request):
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
     if x_forwarded_for:
@@ -26,16 +41,172 @@ def get_client_ip(request):
 #         audit.previous_instance = previous_instance.instance
 #     audit.save()
 
-def store_audit(*, request, instance, action, previous_instance=None, settings_object=None, obj=None):
-    
+
+def field_label(name):
+    return name.replace('_', ' ').upper()
+
+
+def build_audit(*, request, instance, action, settings_object=None, fields=None, before=None):
+    '''
+    returns an unsaved AuditTrail holding the state of instance now, its
+    previous audit is linked by write_audits. fields, {field: label}, records
+    the fields a request set when one audit covers several. before, the
+    snapshot() of instance taken before the change, gives the old values when
+    the object has no earlier audit
+    '''
     audit = AuditTrail()
     audit.model_type = instance._meta.verbose_name.title()
     audit.object_id = instance.pk
     audit.object_str = str(instance) if settings_object is None else str(settings_object)
+    if fields:
+        audit.fields = fields
+        audit.object_str = ', '.join(fields.values())[:255]
     audit.action = action
     audit.user = request.user
     audit.ip = get_client_ip(request)
-    audit.instance = serializers.serialize("json", [instance])
-    if previous_instance:
-        audit.previous_instance = previous_instance.instance
-    audit.save()
+    # taken here, not by the writer: the caller may keep changing instance
+    # and its many to many rows are read as they are now
+    audit.state = snapshot(instance)
+    audit.before = before
+    audit.created_at = timezone.now()
+    return audit
+
+
+def link_audits(audits):
+    '''
+    points each audit at the audit before it for the same object, either a
+    stored one or an earlier one of audits, and turns its snapshot into changes
+    against it (dashboard/audit_snapshots.py). returns the (audit, previous)
+    pairs whose previous is in audits and has no id yet
+    '''
+    recent = get_recent_audits({(audit.model_type, audit.object_id) for audit in audits})
+    states = AuditStates(audit for rows in recent.values() for audit in rows)
+    # (latest audit, its state, audits since its keyframe, its month) per object
+    heads = {}
+    for key, rows in recent.items():
+        head = rows[0]
+        found = states.get(head)
+        if found is None:
+            heads[key] = (head, None, None, None)
+        else:
+            heads[key] = (head, *found, month_of(head.created_at))
+
+    pending = []
+    for audit in audits:
+        key = (audit.model_type, audit.object_id)
+        state = audit.state
+        month = month_of(audit.created_at)
+        # linking again (see write_audits) starts over
+        audit.instance = state
+        audit.changes = None
+        audit.previous = None
+        head = heads.get(key)
+        heads[key] = (audit, state, 0, month)
+        previous_state = None
+        if head is not None:
+            previous, previous_state, depth, previous_month = head
+            if previous.pk is None:
+                pending.append((audit, previous))
+            else:
+                audit.previous = previous
+        if previous_state is None:
+            # nothing in the chain to diff against, stays a keyframe
+            if audit.before is not None:
+                audit.changes = diff(audit.before, state)
+            continue
+        audit.changes = diff(previous_state, state)
+        if depth + 1 < AUDIT_KEYFRAME_INTERVAL and previous_month == month:
+            audit.instance = None
+            heads[key] = (audit, state, depth + 1, month)
+    return pending
+
+
+def lock_chains(keys):
+    '''
+    serializes the writers of the (model_type, object_id) chains in keys until
+    the transaction ends, so two processes never link to the same head. in a
+    consistent order, as two batches may share several objects
+    '''
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for model_type, object_id in sorted(keys, key=str):
+            cursor.execute(
+                'SELECT pg_advisory_xact_lock(hashtextextended(%s, 0))',
+                ['audit-chain:{}:{}'.format(model_type, object_id)],
+            )
+
+
+def write_audits(audits):
+    '''
+    links built audits into their objects' chains and inserts them in one query
+    '''
+    try:
+        with _chain_lock, transaction.atomic():
+            # heads are read under the locks, after any other writer committed
+            lock_chains({(audit.model_type, audit.object_id) for audit in audits})
+            pending = link_audits(audits)
+            AuditTrail.objects.bulk_create(audits)
+            for audit, previous in pending:
+                audit.previous_id = previous.pk
+            AuditTrail.objects.bulk_update([audit for audit, _ in pending], ['previous'])
+    except DatabaseError:
+        # one bad row must not lose the whole batch, each is linked again on its own
+        for audit in audits:
+            audit.pk = None
+            try:
+                with _chain_lock, transaction.atomic():
+                    lock_chains({(audit.model_type, audit.object_id)})
+                    link_audits([audit])
+                    audit.save()
+            except DatabaseError:
+                audit.pk = None
+                logger.exception('failed to write audit of %s %s', audit.model_type, audit.object_id)
+    # bulk_create sends no post_save
+    invalidate_counts(AuditTrail)
+
+
+audit_writer = AuditWriter(
+    write_audits,
+    maxsize=getattr(settings, 'AUDIT_QUEUE_SIZE', 10000),
+    batch_size=getattr(settings, 'AUDIT_BATCH_SIZE', 200),
+    interval=getattr(settings, 'AUDIT_FLUSH_INTERVAL', 1.0),
+)
+
+
+def enqueue_audits(audits):
+    '''
+    hands built audits to the background writer once the current transaction
+    commits, or writes them right away when AUDIT_ASYNC is off
+    '''
+    if not getattr(settings, 'AUDIT_ASYNC', True):
+        write_audits(audits)
+        return
+
+    def put():
+        for audit in audits:
+            audit_writer.put(audit)
+
+    transaction.on_commit(put)
+
+
+def store_audit(*, request, instance, action, settings_object=None, fields=None, before=None, obj=None):
+    audit = build_audit(
+        request=request,
+        instance=instance,
+        action=action,
+        settings_object=settings_object,
+        fields=fields,
+        before=before,
+    )
+    enqueue_audits([audit])
+
+
+def store_audits(*, request, entries):
+    '''
+    records one audit per (instance, action) entry, written with a single bulk insert
+    '''
+    enqueue_audits([
+        build_audit(request=request, instance=instance, action=action)
+        for instance, action in entries
+    ])
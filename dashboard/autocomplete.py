@@ -0,0 +1,136 @@
+import bisect
+import threading
+
+from .cache import get_or_load, update
+from .models import ProductPanel, ProductTier1, Scene, Sector
+
+# In-process prefix index for the header search box.
+# Every live, published row is indexed under its normalized name starting at
+# each word, kept in one sorted list searched with bisect. The index is a
+# process snapshot (see dashboard.cache): the process that saves a row patches
+# its copy from the model signals, the other workers rebuild it on next use.
+
+AUTOCOMPLETE_KEY = 'autocomplete-index'
+AUTOCOMPLETE_LIMIT = 8
+AUTOCOMPLETE_MAX_LIMIT = 20
+
+# type name -> (model, name field, slug field)
+AUTOCOMPLETE_TYPES = {
+    'scene': (Scene, 'title', 'slug'),
+    'scene_category': (Sector, 'name', 'slug'),
+    'product_category': (ProductTier1, 'name', None),
+    'product': (ProductPanel, 'display_text', 'slug'),
+}
+AUTOCOMPLETE_MODELS = {model: type_name for type_name, (model, _, _) in AUTOCOMPLETE_TYPES.items()}
+
+
+def normalize(text):
+    return ' '.join((text or '').casefold().split())
+
+
+class PrefixIndex:
+    def __init__(self):
+        # sorted (term, word position, type, id)
+        self._terms = []
+        # (type, id) -> (terms, suggestion)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _entry(type_name, pk, name, slug):
+        words = normalize(name).split(' ')
+        terms = [(' '.join(words[i:]), i, type_name, pk) for i in range(len(words)) if words[i]]
+        return terms, {'type': type_name, 'id': pk, 'name': name, 'slug': slug}
+
+    def load(self, rows):
+        '''
+        bulk fills an empty index from (type, id, name, slug) rows
+        '''
+        for type_name, pk, name, slug in rows:
+            entry = self._entry(type_name, pk, name, slug)
+            self._entries[(type_name, pk)] = entry
+            self._terms.extend(entry[0])
+        self._terms.sort()
+
+    def add(self, type_name, pk, name, slug):
+        entry = self._entry(type_name, pk, name, slug)
+        with self._lock:
+            self._remove((type_name, pk))
+            for term in entry[0]:
+                bisect.insort(self._terms, term)
+            self._entries[(type_name, pk)] = entry
+
+    def remove(self, type_name, pk):
+        with self._lock:
+            self._remove((type_name, pk))
+
+    def _remove(self, entry_key):
+        entry = self._entries.pop(entry_key, None)
+        if entry is None:
+            return
+        for term in entry[0]:
+            i = bisect.bisect_left(self._terms, term)
+            if i < len(self._terms) and self._terms[i] == term:
+                del self._terms[i]
+
+    def suggest(self, prefix, limit=AUTOCOMPLETE_LIMIT):
+        '''
+        returns up to limit suggestions whose name has a word starting with prefix,
+        names starting with it first
+        '''
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            start = bisect.bisect_left(self._terms, (prefix,))
+            candidates = []
+            seen = set()
+            # a few extra candidates so whole-name matches can win over later words
+            for term, position, type_name, pk in self._terms[start:start + limit * 4]:
+                if not term.startswith(prefix):
+                    break
+                if (type_name, pk) not in seen:
+                    seen.add((type_name, pk))
+                    candidates.append((position, term, self._entries[(type_name, pk)][1]))
+        candidates.sort(key=lambda candidate: candidate[:2])
+        return [suggestion for _, _, suggestion in candidates[:limit]]
+
+
+def is_indexed(instance):
+    return instance.deleted_at is None and instance.status == 'PUBLISHED'
+
+
+def build_index():
+    rows = []
+    for type_name, (model, name_field, slug_field) in AUTOCOMPLETE_TYPES.items():
+        fields = ['id', name_field] + ([slug_field] if slug_field else [])
+        values = model.objects.filter(deleted_at__isnull=True, status='PUBLISHED').order_by().values(*fields)
+        rows.extend((type_name, row['id'], row[name_field], row.get(slug_field)) for row in values)
+    index = PrefixIndex()
+    index.load(rows)
+    return index
+
+
+def get_autocomplete_index():
+    return get_or_load(AUTOCOMPLETE_KEY, build_index)
+
+
+def index_instance(instance):
+    '''
+    reflects a saved row in the index once the transaction commits
+    '''
+    type_name = AUTOCOMPLETE_MODELS[type(instance)]
+    _, name_field, slug_field = AUTOCOMPLETE_TYPES[type_name]
+    if not is_indexed(instance):
+        unindex_instance(instance)
+        return
+    pk = instance.pk
+    name = getattr(instance, name_field)
+    slug = getattr(instance, slug_field) if slug_field else None
+    update(AUTOCOMPLETE_KEY, lambda index: index.add(type_name, pk, name, slug))
+
+
+def unindex_instance(instance):
+    type_name = AUTOCOMPLETE_MODELS[type(instance)]
+    pk = instance.pk
+    update(AUTOCOMPLETE_KEY, lambda index: index.remove(type_name, pk))
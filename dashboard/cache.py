@@ -0,0 +1,117 @@
+import copy
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Process-local snapshots of rows that are read on nearly every request but
+# change rarely (site configuration singletons, ...).
+#
+# Every snapshot key has a version stamp stored in the shared django cache.
+# Writers replace the stamp once their transaction commits, readers compare
+# the stamp with the one their local copy was loaded under and reload on
+# mismatch. Inside a request the stamp is read at most once per key, so every
+# gunicorn worker drops its stale copy within one request.
+
+VERSION_KEY = 'snapshot-version:{}'
+
+_snapshots = {}
+_local = threading.local()
+
+
+def _version_key(key):
+    return VERSION_KEY.format(key)
+
+
+def begin_request():
+    _local.versions = {}
+
+
+def end_request():
+    _local.versions = None
+
+
+def _read_version(key):
+    version = cache.get(_version_key(key))
+    if version is None:
+        # first reader after a restart / eviction seeds the stamp
+        cache.add(_version_key(key), uuid.uuid4().hex, None)
+        version = cache.get(_version_key(key))
+    return version
+
+
+def get_version(key):
+    '''
+    returns the current version stamp of key, read once per request
+    '''
+    versions = getattr(_local, 'versions', None)
+    if versions is None:
+        return _read_version(key)
+    if key not in versions:
+        versions[key] = _read_version(key)
+    return versions[key]
+
+
+def get_or_load(key, loader):
+    '''
+    returns the local snapshot for key, calling loader() when it is missing or stale
+    '''
+    version = get_version(key)
+    entry = _snapshots.get(key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    value = loader()
+    _snapshots[key] = (version, value)
+    return value
+
+
+def invalidate(key):
+    '''
+    replaces the version stamp of key once the current transaction commits
+    '''
+    def bump():
+        cache.set(_version_key(key), uuid.uuid4().hex, None)
+        _snapshots.pop(key, None)
+        versions = getattr(_local, 'versions', None)
+        if versions is not None:
+            versions.pop(key, None)
+
+    transaction.on_commit(bump)
+
+
+def update(key, func):
+    '''
+    like invalidate, but an up to date local snapshot is changed in place
+    with func(value) instead of being reloaded. other processes reload it.
+    '''
+    def bump():
+        previous = cache.get(_version_key(key))
+        version = uuid.uuid4().hex
+        cache.set(_version_key(key), version, None)
+        entry = _snapshots.pop(key, None)
+        if entry is not None and entry[0] == previous:
+            func(entry[1])
+            _snapshots[key] = (version, entry[1])
+        versions = getattr(_local, 'versions', None)
+        if versions is not None:
+            versions.pop(key, None)
+
+    transaction.on_commit(bump)
+
+
+def get_singleton(model, create=False):
+    '''
+    returns a private copy of the single row of model.
+    returns an unsaved instance when the table is empty unless create is True.
+    '''
+    def load():
+        obj = model.objects.first()
+        if obj is None and create:
+            obj = model.objects.create()
+        return obj
+
+    obj = get_or_load(model._meta.label_lower, load)
+    if obj is None:
+        return model()
+    return copy.copy(obj)
@@ -0,0 +1,79 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+from .cache import get_version, invalidate
+
+# Totals for list endpoints.
+# A total is an exact COUNT(*), except for an unfiltered queryset of a table
+# pg_class.reltuples puts at COUNT_ESTIMATE_THRESHOLD rows or more on PostgreSQL,
+# which gets that estimate. A filtered queryset is always counted exactly:
+# EXPLAIN row estimates can be off by orders of magnitude. Either way the result
+# is cached for COUNT_CACHE_TTL seconds under the model's version stamp, which
+# invalidate_counts() replaces on every write (see dashboard.signals).
+
+COUNT_KEY = 'counts:{}'
+COUNT_ESTIMATE_THRESHOLD = getattr(settings, 'COUNT_ESTIMATE_THRESHOLD', 100000)
+COUNT_CACHE_TTL = getattr(settings, 'COUNT_CACHE_TTL', 60)
+
+
+def _count_key(model):
+    return COUNT_KEY.format(model._meta.label_lower)
+
+
+def invalidate_counts(model):
+    invalidate(_count_key(model))
+
+
+def _table_estimate(queryset):
+    with connections[queryset.db].cursor() as cursor:
+        # a partitioned table has no statistics of its own, sum its partitions'
+        cursor.execute(
+            'SELECT CASE c.relkind WHEN %s THEN ('
+            '    SELECT SUM(p.reltuples) FROM pg_inherits i JOIN pg_class p ON p.oid = i.inhrelid'
+            '    WHERE i.inhparent = c.oid AND p.reltuples >= 0'
+            ') ELSE c.reltuples END FROM pg_class c WHERE c.oid = %s::regclass',
+            ['p', queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    # -1 (or no analyzed partition) until the table is first analyzed
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def _estimate(queryset):
+    '''
+    returns the table's row estimate for an unfiltered queryset, None if there
+    is none or queryset is filtered
+    '''
+    if connections[queryset.db].vendor != 'postgresql' or queryset.query.where:
+        return None
+    try:
+        return _table_estimate(queryset)
+    except DatabaseError:
+        return None
+
+
+def get_total(queryset):
+    '''
+    returns (total, exact) for queryset
+    '''
+    query = queryset.order_by().query
+    sql, params = query.sql_with_params()
+    digest = hashlib.sha1(repr((sql, params)).encode()).hexdigest()
+    key = 'count-result:{}:{}'.format(get_version(_count_key(queryset.model)), digest)
+
+    total = cache.get(key)
+    if total is not None:
+        return tuple(total)
+
+    estimate = _estimate(queryset)
+    if estimate is not None and estimate >= COUNT_ESTIMATE_THRESHOLD:
+        total = (estimate, False)
+    else:
+        total = (queryset.count(), True)
+    cache.set(key, total, COUNT_CACHE_TTL)
+    return total
@@ -0,0 +1,109 @@
+import hashlib
+
+from rest_framework.renderers import JSONRenderer
+
+from .cache import get_or_load
+from .models import HomePageOption, Scene, SiteConfig, ThemeOption, UnityScene
+from .serializers import SceneSerializer, UnitySceneSerializer
+
+# Pre-rendered public documents. Each one is built from a handful of models,
+# stored as rendered JSON in the process snapshot cache and rebuilt only after
+# one of its source models is saved (see dashboard.signals).
+
+CONFIG_DOCUMENT_KEY = 'config-document'
+CONFIG_DOCUMENT_MODELS = (HomePageOption, SiteConfig, ThemeOption, Scene, UnityScene)
+
+
+class Document:
+    def __init__(self, content):
+        self.content = content
+        self.etag = '"{}"'.format(hashlib.sha1(content).hexdigest())
+
+
+def build_config_data():
+    instance = HomePageOption.get_instance()
+    settings = SiteConfig.get_instance()
+
+    title = None if settings.title == '' else settings.title
+    favicon = None if settings.favicon == '' else settings.favicon.url
+
+    theme_obj = ThemeOption.objects.filter(deleted_at__isnull=True).order_by()
+    theme_settings = {obj.key: obj.value for obj in theme_obj}
+
+    if settings.immersive_experience:
+        scene = settings.default_scene
+        serializer = SceneSerializer(scene)
+
+        if scene.unity_scene is not None:
+            loading_text = scene.unity_scene.loading_text
+        else:
+            loading_text = settings.default_loading_text
+
+        data = {
+            "scene_id":serializer.data["id"],
+            "scene_title":serializer.data["title"],
+            "background_image":serializer.data["image"],
+            "loading_text":loading_text,
+            "loading_image":settings.loading_image.url if settings.loading_image else None
+        }
+        response_key = 'immersive_details'
+
+    elif instance.option == 'IMAGE':
+        data = {
+            "type": "IMAGE",
+            "image":instance.image.url if instance.image else None
+        }
+        response_key = 'homepage'
+
+    elif instance.option == 'VIDEO':
+        data = {
+            "type":"VIDEO",
+            "video_embed_code":instance.video_embed_code or "null"
+        }
+        response_key = 'homepage'
+
+    else:
+        serializer = UnitySceneSerializer(instance.scene)
+
+        try:
+            associated_scene = Scene.objects.get(unity_scene=instance.scene)
+        except Scene.DoesNotExist:
+            associated_scene = None
+
+        data = {
+            "type":"SCENE",
+            'unity_scene_id':serializer.data['id'],
+            'name':serializer.data['name'],
+            'build_url':serializer.data['build_url'],
+            'background_image':serializer.data['background_image'],
+            'loading_text':serializer.data['loading_text'],
+        }
+
+        if associated_scene:
+            associated_scene_data = SceneSerializer(associated_scene)
+            data['associated_scene'] = {
+                'id' : associated_scene_data.data['id'],
+                'title' : associated_scene_data.data['title'],
+                'slug': associated_scene_data.data['slug'],
+                'image': associated_scene_data.data['image']
+            }
+        response_key = 'homepage'
+
+    return {
+        "title":title,
+        "favicon":favicon,
+        "immersive_experience":settings.immersive_experience,
+        "browse_without_login":settings.browse_without_login,
+        response_key : data,
+        "theme_settings":theme_settings
+    }
+
+
+def get_config_document():
+    '''
+    returns the rendered ConfigView payload, built on first use after a change
+    '''
+    return get_or_load(
+        CONFIG_DOCUMENT_KEY,
+        lambda: Document(JSONRenderer().render({"data": build_config_data()})),
+    )
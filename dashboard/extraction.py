@@ -0,0 +1,737 @@
+import hashlib
+import logging
+import os
+import shutil
+import struct
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import invalidate
+from .models import UnityScene
+
+logger = logging.getLogger(__name__)
+
+# Unity build extraction.
+# Uploading a unity scene only stores its zip. The build is unpacked by a pool
+# of UNITY_EXTRACT_WORKERS threads in the web process, and the job lives on the UnityScene row (extraction_* fields):
+# a worker claims it with one UPDATE from PENDING (or from a stale EXTRACTING)
+# to EXTRACTING, reports bytes written and progress at most every
+# EXTRACT_REPORT_INTERVAL seconds, and ends it READY or FAILED. A job whose
+# heartbeat is older than UNITY_EXTRACT_STALE_AFTER seconds lost its process
+# and is claimed again by resume_extractions() (run at startup) or when its
+# status is polled. A process queues a job once until one of its workers
+# starts it, however often the job is polled.
+# A job decompresses the members of its zip on UNITY_EXTRACT_THREADS threads of
+# its own, each streaming EXTRACT_CHUNK_SIZE at a time, and refuses a zip with
+# more than UNITY_EXTRACT_MAX_FILES members or UNITY_EXTRACT_MAX_BYTES
+# uncompressed bytes before writing anything. `manage.py benchmark_unity_extract`
+# compares it with zipfile's extractall.
+# Builds are versioned: a zip is extracted under a temporary name and renamed
+# to media/unity/builds/<sha256 of the zip> once complete, so a build is never
+# seen half written and its files never change. UnityScene.build_version points
+# at the active build and previous_build_version at the one it replaced
+# (rollback swaps them); media/unity/<name> is a symlink to the active build,
+# swapped atomically, for clients that address builds by scene name. A build no
+# scene points at is deleted UNITY_BUILD_GRACE seconds after it was swapped out,
+# so viewers still downloading it finish first. A temporary extraction is kept
+# until it has not been touched for TEMP_BUILD_STALE_AFTER, whatever the grace:
+# its job touches it with every progress report.
+# Build files are hardlinks into a content addressed store, media/unity/blobs,
+# holding each distinct file once. The store indexes the sha256 of a member's
+# compressed bytes, so a member already seen in an earlier build is linked
+# without being decompressed or written: an incremental build costs the disk
+# and time of what changed. A blob no build links to is collected with the
+# builds.
+
+UNITY_EXTRACT_WORKERS = getattr(settings, 'UNITY_EXTRACT_WORKERS', 2)
+UNITY_EXTRACT_STALE_AFTER = getattr(settings, 'UNITY_EXTRACT_STALE_AFTER', 300)
+UNITY_EXTRACT_THREADS = getattr(settings, 'UNITY_EXTRACT_THREADS', 4)
+UNITY_EXTRACT_MAX_FILES = getattr(settings, 'UNITY_EXTRACT_MAX_FILES', 20000)
+UNITY_EXTRACT_MAX_BYTES = getattr(settings, 'UNITY_EXTRACT_MAX_BYTES', 4 * 1024 ** 3)
+UNITY_BUILD_GRACE = getattr(settings, 'UNITY_BUILD_GRACE', 24 * 3600)
+BUILDS_DIR = 'builds'
+BLOBS_DIR = 'blobs'
+TEMP_BUILD_PREFIX = '.tmp-'
+# well past the heartbeat of a lost job, so no live extraction is collected
+TEMP_BUILD_STALE_AFTER = 4 * UNITY_EXTRACT_STALE_AFTER
+LEGACY_BUILD_PREFIX = 'legacy-'
+EXTRACT_CHUNK_SIZE = 1024 * 1024
+EXTRACT_REPORT_INTERVAL = 1.0
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+# pks of the jobs waiting in this process's executor
+_queued = set()
+
+
+class ExtractionError(Exception):
+    pass
+
+
+class BuildMissing(ExtractionError):
+    pass
+
+
+def get_executor():
+    global _executor, _executor_pid
+    with _executor_lock:
+        # a forked worker gets its own threads
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=UNITY_EXTRACT_WORKERS, thread_name_prefix='unity-extract')
+            _executor_pid = os.getpid()
+            _queued.clear()
+    return _executor
+
+
+def submit_extraction(pk):
+    '''
+    queues the job of unity scene pk unless it is already waiting in this process
+    '''
+    executor = get_executor()
+    with _executor_lock:
+        if pk in _queued:
+            return
+        _queued.add(pk)
+    executor.submit(run_queued_extraction, pk)
+
+
+def run_queued_extraction(pk):
+    with _executor_lock:
+        # from here a new upload of the scene needs a job of its own
+        _queued.discard(pk)
+    run_extraction(pk)
+
+
+def unity_dir():
+    return os.path.join(settings.MEDIA_ROOT, 'unity')
+
+
+def build_dir(version):
+    return os.path.join(unity_dir(), BUILDS_DIR, version)
+
+
+def build_url(unity_scene):
+    if unity_scene.build_version:
+        return '{}unity/{}/{}/'.format(settings.MEDIA_URL, BUILDS_DIR, unity_scene.build_version)
+    # extracted in place before builds were versioned
+    return '{}unity/{}/'.format(settings.MEDIA_URL, unity_scene.name)
+
+
+def member_path(root, name):
+    '''
+    returns the path zip member name extracts to, ExtractionError if it would
+    land outside root
+    '''
+    path = os.path.normpath(os.path.join(root, name))
+    if os.path.isabs(name) or os.path.commonpath([root, path]) != root:
+        raise ExtractionError('unsafe path in zip: {}'.format(name))
+    return path
+
+
+# ---------------------------------------------------------------------------------------------------------
+# JOBS
+# ---------------------------------------------------------------------------------------------------------
+def set_status(queryset, **fields):
+    '''
+    updates the job of queryset, returns the number of rows updated. queryset
+    updates send no signal, so the config document (which shows
+    extraction_status) is invalidated here
+    '''
+    # documents imports the serializers, which import this module
+    from .documents import CONFIG_DOCUMENT_KEY
+
+    updated = queryset.update(extraction_updated_at=timezone.now(), **fields)
+    if updated and fields.keys() & {'extraction_status', 'build_version'}:
+        invalidate(CONFIG_DOCUMENT_KEY)
+    return updated
+
+
+def stale_before():
+    return timezone.now() - timezone.timedelta(seconds=UNITY_EXTRACT_STALE_AFTER)
+
+
+def is_stale(updated_at):
+    '''
+    True if a job whose heartbeat is updated_at lost its worker
+    '''
+    return updated_at is None or updated_at < stale_before()
+
+
+def claimable():
+    stale = stale_before()
+    return Q(deleted_at__isnull=True) & (
+        Q(extraction_status=UnityScene.EXTRACTION_PENDING)
+        | Q(extraction_status=UnityScene.EXTRACTION_EXTRACTING, extraction_updated_at__lt=stale)
+        | Q(extraction_status=UnityScene.EXTRACTION_EXTRACTING, extraction_updated_at__isnull=True)
+    )
+
+
+def schedule_extraction(unity_scene):
+    '''
+    resets the extraction job of unity_scene and starts it once the current
+    transaction commits
+    '''
+    fields = {
+        'extraction_status': UnityScene.EXTRACTION_PENDING,
+        'extraction_progress': 0,
+        'extraction_bytes': 0,
+        'extraction_total_bytes': None,
+        'extraction_error': '',
+        'extraction_started_at': None,
+    }
+    # the active build keeps being served until the new one replaces it
+    set_status(UnityScene.objects.filter(pk=unity_scene.pk), **fields)
+    for name, value in fields.items():
+        setattr(unity_scene, name, value)
+    pk = unity_scene.pk
+    transaction.on_commit(lambda: submit_extraction(pk))
+
+
+def resume_extraction(pk):
+    '''
+    starts the job of unity scene pk if it is pending or stale, for a poll
+    '''
+    if UnityScene.objects.filter(claimable(), pk=pk).exists():
+        submit_extraction(pk)
+
+
+def resume_extractions():
+    '''
+    starts every pending or stale job, the other processes race for them safely
+    '''
+    for pk in UnityScene.objects.filter(claimable()).values_list('pk', flat=True):
+        submit_extraction(pk)
+
+
+def run_extraction(pk):
+    try:
+        claimed = set_status(
+            UnityScene.objects.filter(claimable(), pk=pk),
+            extraction_status=UnityScene.EXTRACTION_EXTRACTING,
+            extraction_started_at=timezone.now(),
+        )
+        if not claimed:
+            # done, deleted, or running in another process
+            return
+        unity_scene = UnityScene.objects.get(pk=pk)
+        try:
+            extract_unity_file(unity_scene, ExtractionProgress(pk))
+        except Exception as error:
+            logger.exception('failed to extract unity scene %s', pk)
+            set_status(
+                UnityScene.objects.filter(pk=pk),
+                extraction_status=UnityScene.EXTRACTION_FAILED,
+                extraction_error=str(error) or error.__class__.__name__,
+            )
+    finally:
+        close_old_connections()
+
+
+class ExtractionProgress:
+    '''
+    writes the bytes written and progress of a job to its row
+    '''
+
+    def __init__(self, pk):
+        self.pk = pk
+        self.total = None
+        self.written = 0
+
+    def start(self, total):
+        self.total = total
+        self.save(extraction_total_bytes=total)
+
+    def update(self, written):
+        self.written = written
+        self.save()
+
+    def finish(self, stats, version):
+        self.written = stats.bytes
+        activate_build(self.pk, version, extraction_status=UnityScene.EXTRACTION_READY,
+                       extraction_progress=100, extraction_bytes=self.written)
+
+    def save(self, **fields):
+        fields.setdefault('extraction_progress', min(99, self.written * 100 // self.total) if self.total else 0)
+        set_status(UnityScene.objects.filter(pk=self.pk), extraction_bytes=self.written, **fields)
+
+
+# ---------------------------------------------------------------------------------------------------------
+# EXTRACTOR
+# ---------------------------------------------------------------------------------------------------------
+class ExtractionStats:
+    def __init__(self, files, bytes, seconds, reused=0, reused_bytes=0):
+        self.files = files
+        self.bytes = bytes
+        self.seconds = seconds
+        # members linked from the blob store
+        self.reused = reused
+        self.reused_bytes = reused_bytes
+
+    @property
+    def throughput(self):
+        '''
+        uncompressed bytes written per second
+        '''
+        return self.bytes / self.seconds if self.seconds else 0
+
+    def __str__(self):
+        return '{} files ({} reused), {:.1f} MB ({:.1f} MB reused) in {:.2f}s ({:.1f} MB/s)'.format(
+            self.files, self.reused, self.bytes / 1024 ** 2, self.reused_bytes / 1024 ** 2,
+            self.seconds, self.throughput / 1024 ** 2)
+
+
+class ZipExtractor:
+    '''
+    extracts a zip into root, decompressing its members on a pool of threads,
+    through blobs (a BlobStore) when given. on_progress(bytes written) is
+    called from the calling thread about every EXTRACT_REPORT_INTERVAL seconds
+    '''
+
+    def __init__(self, archive, root, threads=None, max_files=None, max_bytes=None, blobs=None):
+        self.archive = archive
+        self.root = os.path.abspath(root)
+        self.threads = threads or UNITY_EXTRACT_THREADS
+        self.max_files = max_files or UNITY_EXTRACT_MAX_FILES
+        self.max_bytes = max_bytes or UNITY_EXTRACT_MAX_BYTES
+        self.blobs = blobs
+        self.keys = {}
+        self.written = 0
+        self.reused = 0
+        self.reused_bytes = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def plan(self):
+        '''
+        returns (directories, {path: member}) of the archive, ExtractionError
+        when it breaks a cap or a member would land outside root
+        '''
+        members = self.archive.infolist()
+        if len(members) > self.max_files:
+            raise ExtractionError('zip has {} members, more than the {} allowed'.format(len(members), self.max_files))
+        total = sum(member.file_size for member in members)
+        if total > self.max_bytes:
+            raise ExtractionError('zip holds {} bytes uncompressed, more than the {} allowed'.format(total, self.max_bytes))
+
+        directories = {self.root}
+        files = {}
+        for member in members:
+            path = member_path(self.root, member.filename)
+            if member.is_dir():
+                directories.add(path)
+            else:
+                directories.add(os.path.dirname(path))
+                # a repeated name is overwritten by the later member, as extractall does
+                files[path] = member
+        if self.blobs is not None:
+            # read in this thread, before the pool shares the archive
+            for path, member in files.items():
+                self.keys[path] = self.blobs.member_key(self.archive.fp, member)
+        return sorted(directories), files
+
+    def count(self, size):
+        with self.lock:
+            self.written += size
+            # zipfile stops at the declared sizes, checked by plan(); this
+            # guards against one that does not
+            if self.written > self.max_bytes:
+                raise ExtractionError('zip expands past the {} bytes allowed'.format(self.max_bytes))
+
+    def copy(self, member, path):
+        if self.blobs is None:
+            self.stream(member, path)
+            return
+
+        key = self.keys[path]
+        blob = self.blobs.lookup(key)
+        if blob is not None and self.blobs.link(blob, path):
+            self.count(member.file_size)
+            with self.lock:
+                self.reused += 1
+                self.reused_bytes += member.file_size
+            return
+        temp = self.blobs.temp_path()
+        try:
+            digest = self.stream(member, temp)
+            blob = self.blobs.add(temp, digest, key)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        if not self.blobs.link(blob, path):
+            # collected between add and link, the build gets a copy of its own
+            with self.lock:
+                self.written -= member.file_size
+            self.stream(member, path)
+
+    def stream(self, member, path):
+        '''
+        decompresses member into path, returns the sha256 of its content
+        '''
+        digest = hashlib.sha256()
+        with self.archive.open(member) as source, open(path, 'wb') as target:
+            while not self.stopped.is_set():
+                chunk = source.read(EXTRACT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                target.write(chunk)
+                if self.blobs is not None:
+                    digest.update(chunk)
+                self.count(len(chunk))
+        return digest.hexdigest()
+
+    def extract(self, on_progress=None, plan=None):
+        started = time.monotonic()
+        directories, files = plan or self.plan()
+        for directory in directories:
+            os.makedirs(directory, exist_ok=True)
+
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='unity-unzip') as pool:
+            # largest first, so one big member does not finish alone at the end
+            ordered = sorted(files.items(), key=lambda item: item[1].file_size, reverse=True)
+            pending = {pool.submit(self.copy, member, path) for path, member in ordered}
+            while pending:
+                done, pending = wait(pending, timeout=EXTRACT_REPORT_INTERVAL, return_when=FIRST_EXCEPTION)
+                for future in done:
+                    if future.exception() is not None:
+                        self.stopped.set()
+                        pool.shutdown(cancel_futures=True)
+                        raise future.exception()
+                if on_progress is not None and pending:
+                    on_progress(self.written)
+        return ExtractionStats(len(files), self.written, time.monotonic() - started, self.reused, self.reused_bytes)
+
+
+# ---------------------------------------------------------------------------------------------------------
+# BLOBS
+# ---------------------------------------------------------------------------------------------------------
+# signature, version, flags, method, time, date, crc, sizes, name and extra lengths
+LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+
+class BlobStore:
+    '''
+    files stored once under root by the sha256 of their content
+    (root/ab/abcd...), and root/keys, mapping the compressed bytes of a zip
+    member to the blob they decompress to
+    '''
+
+    def __init__(self, root):
+        self.root = root
+        self.keys_dir = os.path.join(root, 'keys')
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def key_path(self, key):
+        return os.path.join(self.keys_dir, key)
+
+    def temp_path(self):
+        os.makedirs(self.root, exist_ok=True)
+        return os.path.join(self.root, '{}{}'.format(TEMP_BUILD_PREFIX, uuid.uuid4().hex))
+
+    def member_key(self, file, member):
+        '''
+        returns the key of a zip member: its compression method and the sha256
+        of its compressed bytes, read from the zip file without decompressing
+        '''
+        file.seek(member.header_offset)
+        header = LOCAL_HEADER.unpack(file.read(LOCAL_HEADER.size))
+        if header[0] != LOCAL_HEADER_SIGNATURE:
+            raise ExtractionError('bad zip member: {}'.format(member.filename))
+        # past the name and extra field
+        file.seek(header[9] + header[10], os.SEEK_CUR)
+        digest = hashlib.sha256()
+        remaining = member.compress_size
+        while remaining > 0:
+            chunk = file.read(min(EXTRACT_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise ExtractionError('truncated zip member: {}'.format(member.filename))
+            digest.update(chunk)
+            remaining -= len(chunk)
+        return '{}-{}'.format(member.compress_type, digest.hexdigest())
+
+    def lookup(self, key):
+        '''
+        returns the path of the blob stored under key, None if unknown or gone
+        '''
+        try:
+            with open(self.key_path(key)) as file:
+                path = self.blob_path(file.read().strip())
+        except FileNotFoundError:
+            return None
+        return path if os.path.isfile(path) else None
+
+    def add(self, temp, digest, key):
+        '''
+        moves the file temp, whose content has sha256 digest, into the store
+        under key and returns its blob path
+        '''
+        path = self.blob_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            # a blob already stored starts its grace again, so collect leaves
+            # it to be linked
+            os.utime(path)
+        except FileNotFoundError:
+            # shared by every build linking it, never written again
+            os.chmod(temp, 0o444)
+            os.replace(temp, path)
+        else:
+            os.remove(temp)
+
+        os.makedirs(self.keys_dir, exist_ok=True)
+        temp = self.temp_path()
+        with open(temp, 'w') as file:
+            file.write(digest)
+        os.replace(temp, self.key_path(key))
+        return path
+
+    def link(self, blob, path):
+        '''
+        materializes blob at path, False when the blob is gone
+        '''
+        try:
+            os.link(blob, path)
+        except FileNotFoundError:
+            return False
+        except OSError:
+            # no hardlinks on this file system
+            try:
+                shutil.copyfile(blob, path)
+            except FileNotFoundError:
+                return False
+        return True
+
+    def collect(self, grace):
+        '''
+        deletes the blobs no build links to any more older than grace seconds,
+        the temporary files untouched for TEMP_BUILD_STALE_AFTER (or grace if
+        longer), then the keys of deleted blobs. returns the number of blobs
+        deleted
+        '''
+        expired = time.time() - grace
+        stale = time.time() - max(grace, TEMP_BUILD_STALE_AFTER)
+        removed = 0
+        for directory, directories, files in os.walk(self.root):
+            if directory == self.root and os.path.basename(self.keys_dir) in directories:
+                directories.remove(os.path.basename(self.keys_dir))
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime >= expired:
+                    continue
+                if name.startswith(TEMP_BUILD_PREFIX):
+                    if stat.st_mtime < stale:
+                        os.remove(path)
+                elif stat.st_nlink == 1:
+                    os.remove(path)
+                    removed += 1
+
+        if removed and os.path.isdir(self.keys_dir):
+            for key in os.listdir(self.keys_dir):
+                if self.lookup(key) is None:
+                    try:
+                        os.remove(self.key_path(key))
+                    except FileNotFoundError:
+                        pass
+        return removed
+
+
+def blob_store():
+    return BlobStore(os.path.join(unity_dir(), BLOBS_DIR))
+
+
+def hash_file(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(EXTRACT_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def extract_unity_file(unity_scene, progress):
+    '''
+    extracts unity_scene's zip into its versioned build directory and makes
+    it the active build
+    '''
+    with unity_scene.unity_file.open('rb') as file:
+        version = hash_file(file)
+        if os.path.isdir(build_dir(version)):
+            # the same zip was uploaded before, keep collect_builds off it
+            touch_build(build_dir(version))
+            logger.info('unity scene %s reuses build %s', unity_scene.pk, version)
+            try:
+                progress.finish(ExtractionStats(0, 0, 0), version)
+                return
+            except BuildMissing:
+                logger.info('build %s was collected meanwhile, extracting it again', version)
+
+        temp = os.path.join(unity_dir(), BUILDS_DIR, '{}{}-{}'.format(TEMP_BUILD_PREFIX, version, uuid.uuid4().hex))
+
+        def on_progress(written):
+            touch_build(temp)
+            progress.update(written)
+
+        try:
+            with zipfile.ZipFile(file) as archive:
+                extractor = ZipExtractor(archive, temp, blobs=blob_store())
+                directories, files = extractor.plan()
+                progress.start(sum(member.file_size for member in files.values()))
+                stats = extractor.extract(on_progress, (directories, files))
+            try:
+                os.rename(temp, build_dir(version))
+            except OSError:
+                if not os.path.isdir(build_dir(version)):
+                    raise
+                # extracted by another job meanwhile
+                shutil.rmtree(temp, ignore_errors=True)
+            # its grace starts now, not when the extraction started
+            touch_build(build_dir(version))
+        except BaseException:
+            shutil.rmtree(temp, ignore_errors=True)
+            raise
+    logger.info('extracted unity scene %s: %s', unity_scene.pk, stats)
+    progress.finish(stats, version)
+
+
+# ---------------------------------------------------------------------------------------------------------
+# BUILDS
+# ---------------------------------------------------------------------------------------------------------
+def touch_build(path):
+    '''
+    restarts the grace period of a build, see collect_builds
+    '''
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def adopt_legacy_build(name):
+    '''
+    moves a build extracted in place at media/unity/<name> under builds,
+    returns its version or ''
+    '''
+    path = os.path.join(unity_dir(), name)
+    if os.path.islink(path) or not os.path.isdir(path):
+        return ''
+    version = '{}{}'.format(LEGACY_BUILD_PREFIX, uuid.uuid4().hex)
+    os.makedirs(os.path.join(unity_dir(), BUILDS_DIR), exist_ok=True)
+    try:
+        os.rename(path, build_dir(version))
+    except OSError:
+        return ''
+    return version
+
+
+def link_build(name, version):
+    '''
+    points media/unity/<name> at build version, replacing the link atomically
+    '''
+    link = os.path.join(unity_dir(), name)
+    temp = os.path.join(os.path.dirname(link), '.{}.{}'.format(os.path.basename(link), uuid.uuid4().hex))
+    try:
+        os.symlink(os.path.relpath(build_dir(version), os.path.dirname(link)), temp)
+        os.replace(temp, link)
+    except OSError:
+        # the build stays reachable at its build_url
+        logger.warning('could not link unity build %s to %s', version, link, exc_info=True)
+        if os.path.lexists(temp):
+            os.remove(temp)
+
+
+def activate_build(pk, version, **fields):
+    '''
+    makes build version the active build of unity scene pk, keeping the one it
+    replaces for rollback, BuildMissing when collect_builds deleted it first
+    '''
+    with transaction.atomic():
+        unity_scene = UnityScene.objects.select_for_update().get(pk=pk)
+        if not os.path.isdir(build_dir(version)):
+            raise BuildMissing('unity build {} no longer exists'.format(version))
+        legacy = adopt_legacy_build(unity_scene.name)
+        current = unity_scene.build_version or legacy
+        dropped = ''
+        if current and current != version:
+            dropped = unity_scene.previous_build_version
+            fields['previous_build_version'] = current
+        set_status(UnityScene.objects.filter(pk=pk), build_version=version, **fields)
+    link_build(unity_scene.name, version)
+    if dropped and dropped not in (version, current):
+        touch_build(build_dir(dropped))
+    if collect_builds():
+        blob_store().collect(UNITY_BUILD_GRACE)
+
+
+def rollback_build(unity_scene):
+    '''
+    swaps the active and previous builds of unity_scene, ExtractionError when
+    there is none to go back to
+    '''
+    with transaction.atomic():
+        unity_scene = UnityScene.objects.select_for_update().get(pk=unity_scene.pk)
+        previous = unity_scene.previous_build_version
+        if not previous or not os.path.isdir(build_dir(previous)):
+            raise ExtractionError('unity scene has no previous build')
+        unity_scene.previous_build_version = unity_scene.build_version
+        unity_scene.build_version = previous
+        set_status(UnityScene.objects.filter(pk=unity_scene.pk), build_version=previous,
+                   previous_build_version=unity_scene.previous_build_version)
+    link_build(unity_scene.name, previous)
+    return unity_scene
+
+
+def collect_builds(grace=None):
+    '''
+    deletes the builds no scene points at that were swapped out more than
+    grace seconds ago, and the temporary extractions untouched for
+    TEMP_BUILD_STALE_AFTER (or grace if longer), returns their names
+    '''
+    grace = UNITY_BUILD_GRACE if grace is None else grace
+    root = os.path.join(unity_dir(), BUILDS_DIR)
+    try:
+        entries = os.listdir(root)
+    except FileNotFoundError:
+        return []
+    used = set()
+    for versions in UnityScene.objects.values_list('build_version', 'previous_build_version'):
+        used.update(versions)
+    expired = time.time() - grace
+    stale = time.time() - max(grace, TEMP_BUILD_STALE_AFTER)
+    removed = []
+    for entry in entries:
+        path = os.path.join(root, entry)
+        if entry in used or not os.path.isdir(path):
+            continue
+        temporary = entry.startswith(TEMP_BUILD_PREFIX)
+        try:
+            if os.stat(path).st_mtime >= (stale if temporary else expired):
+                continue
+        except FileNotFoundError:
+            continue
+        if not temporary:
+            # renamed away first, so activate_build sees the build whole or not at all
+            trash = os.path.join(root, '{}deleted-{}'.format(TEMP_BUILD_PREFIX, uuid.uuid4().hex))
+            try:
+                os.rename(path, trash)
+            except OSError:
+                continue
+            path = trash
+        shutil.rmtree(path, ignore_errors=True)
+        removed.append(entry)
+    return removed
@@ -0,0 +1,37 @@
+from django.db import models
+from rest_framework import serializers
+
+
+def load_relations(instances, relations):
+    '''
+    fills the cache of each forward relation in relations for all instances,
+    with one in_bulk query per relation.
+    relations that are already cached (select_related, ...) are left alone.
+    '''
+    if not instances:
+        return instances
+    opts = instances[0]._meta
+    for name in relations:
+        field = opts.get_field(name)
+        pending = [obj for obj in instances if not field.is_cached(obj)]
+        ids = {getattr(obj, field.attname) for obj in pending} - {None}
+        related = field.related_model.objects.in_bulk(ids) if ids else {}
+        for obj in pending:
+            field.set_cached_value(obj, related.get(getattr(obj, field.attname)))
+    return instances
+
+
+class BatchRelationListSerializer(serializers.ListSerializer):
+    '''
+    List serializer that loads the child's Meta.batch_relations for the whole
+    page before rendering, so per-row relation access runs no queries.
+    children can load anything else for the page in a preload(instances) method.
+    '''
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        instances = list(iterable)
+        load_relations(instances, getattr(self.child.Meta, 'batch_relations', ()))
+        if hasattr(self.child, 'preload'):
+            self.child.preload(instances)
+        return super().to_representation(instances)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.audit_archive import AUDIT_RETENTION_MONTHS, apply_retention, ensure_partitions
+
+
+class Command(BaseCommand):
+    help = 'creates upcoming audit partitions and archives audits older than AUDIT_RETENTION_MONTHS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=AUDIT_RETENTION_MONTHS,
+                            help='number of months of audits to keep in the database')
+
+    def handle(self, *args, **options):
+        if options['months'] < 1:
+            raise CommandError('--months must keep at least the current month')
+        for month in ensure_partitions():
+            self.stdout.write('created audit partition {:%Y-%m}'.format(month))
+        for month, count in apply_retention(options['months']):
+            self.stdout.write('archived {} audits of {:%Y-%m}'.format(count, month))
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+
+from django.core.management.base import BaseCommand
+
+from dashboard.extraction import UNITY_EXTRACT_THREADS, BlobStore, ExtractionStats, ZipExtractor
+
+
+def write_build(path, size, files):
+    '''
+    writes a zip shaped like a WebGL build: a few large .data/.wasm members
+    holding most of the bytes (half incompressible, half repetitive) and many
+    small ones
+    '''
+    large = max(1, files // 20)
+    large_size = size * 9 // 10 // large
+    small_size = max(1, size // 10 // max(1, files - large))
+    pattern = b'UnityWebData1.0\x00' * 4096
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for index in range(files):
+            name = 'Build/build{}.data'.format(index) if index < large else 'StreamingAssets/asset{}.bin'.format(index)
+            member_size = large_size if index < large else small_size
+            with archive.open(name, 'w', force_zip64=True) as member:
+                written = 0
+                while written < member_size:
+                    count = min(len(pattern), member_size - written)
+                    member.write(os.urandom(count) if written % (2 * len(pattern)) == 0 else pattern[:count])
+                    written += count
+
+
+def write_next_build(path, previous):
+    '''
+    writes the build after previous: the same members but one small one changed
+    '''
+    with zipfile.ZipFile(previous) as source, zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        members = source.infolist()
+        for member in members:
+            data = source.read(member)
+            if member is members[-1]:
+                data = os.urandom(len(data))
+            archive.writestr(member.filename, data)
+
+
+def store_size(root):
+    total = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            total += os.stat(os.path.join(directory, name)).st_size
+    return total
+
+
+class Command(BaseCommand):
+    help = ('compares the unity build extractor with zipfile extractall on a synthetic build, '
+            'then a full and an incremental build through the blob store')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1024, help='uncompressed size of the build in MB')
+        parser.add_argument('--files', type=int, default=400, help='number of members in the build')
+        parser.add_argument('--threads', type=int, default=UNITY_EXTRACT_THREADS)
+        parser.add_argument('--dir', default=None, help='scratch directory, a temporary one by default')
+
+    def handle(self, *args, **options):
+        scratch = tempfile.mkdtemp(dir=options['dir'])
+        try:
+            path = os.path.join(scratch, 'build.zip')
+            self.stdout.write('writing a {} MB build of {} files'.format(options['size'], options['files']))
+            write_build(path, options['size'] * 1024 ** 2, options['files'])
+            self.stdout.write('zip is {:.1f} MB'.format(os.path.getsize(path) / 1024 ** 2))
+
+            with zipfile.ZipFile(path) as archive:
+                started = time.monotonic()
+                archive.extractall(os.path.join(scratch, 'extractall'))
+                seconds = time.monotonic() - started
+                total = sum(member.file_size for member in archive.infolist())
+            self.stdout.write('extractall: {}'.format(ExtractionStats(options['files'], total, seconds)))
+            shutil.rmtree(os.path.join(scratch, 'extractall'))
+
+            with zipfile.ZipFile(path) as archive:
+                extractor = ZipExtractor(archive, os.path.join(scratch, 'extractor'), threads=options['threads'],
+                                         max_files=options['files'], max_bytes=total)
+                stats = extractor.extract()
+            self.stdout.write('extractor ({} threads): {}'.format(options['threads'], stats))
+            shutil.rmtree(os.path.join(scratch, 'extractor'))
+
+            next_path = os.path.join(scratch, 'next.zip')
+            write_next_build(next_path, path)
+            blobs = BlobStore(os.path.join(scratch, 'blobs'))
+            for name, build in (('first build', path), ('next build', next_path)):
+                before = store_size(blobs.root)
+                with zipfile.ZipFile(build) as archive:
+                    extractor = ZipExtractor(archive, os.path.join(scratch, name), threads=options['threads'],
+                                             max_files=options['files'], max_bytes=total, blobs=blobs)
+                    stats = extractor.extract()
+                self.stdout.write('blob store, {}: {}, {:.1f} MB stored'.format(
+                    name, stats, (store_size(blobs.root) - before) / 1024 ** 2))
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
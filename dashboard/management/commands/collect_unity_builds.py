@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.extraction import UNITY_BUILD_GRACE, blob_store, collect_builds
+
+
+class Command(BaseCommand):
+    help = ('deletes unity builds no scene uses that were replaced more than UNITY_BUILD_GRACE seconds ago, '
+            'and the blobs only they linked')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=UNITY_BUILD_GRACE,
+                            help='seconds a replaced build is kept for viewers still loading it')
+
+    def handle(self, *args, **options):
+        for name in collect_builds(options['grace']):
+            self.stdout.write('deleted unity build {}'.format(name))
+        removed = blob_store().collect(options['grace'])
+        self.stdout.write('deleted {} unity blobs'.format(removed))
@@ -0,0 +1,249 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+# Media serving.
+# Unity WebGL builds ship precompressed files (Build/x.data.br, x.wasm.gz,
+# x.unityweb). The loader only uses them directly when they come with the
+# Content-Encoding they were compressed with and the Content-Type of what they
+# hold (application/wasm for code), otherwise it decompresses them in
+# JavaScript, which is much slower. This view serves MEDIA_ROOT with:
+#  - x.br / x.gz sent as x with Content-Encoding br / gzip when the client
+#    accepts it, as an opaque brotli / gzip file when it does not;
+#  - x.unityweb sniffed for the gzip magic or Unity's brotli marker;
+#  - a plain x request answered with x.br or x.gz when one exists and is
+#    accepted (Vary: Accept-Encoding);
+#  - single byte ranges, ETag / Last-Modified revalidation, and a year of
+#    immutable caching for versioned builds (media/unity/builds/<sha256>/...,
+#    see dashboard/extraction.py).
+
+SERVE_MEDIA = getattr(settings, 'SERVE_MEDIA', settings.DEBUG)
+IMMUTABLE_PREFIX = 'unity/builds/'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# suffix of a precompressed file, the Content-Encoding it is sent with
+ENCODINGS = (('.br', 'br'), ('.gz', 'gzip'))
+# Content-Type of a compressed file sent without its Content-Encoding
+OPAQUE_TYPES = {'br': 'application/x-brotli', 'gzip': 'application/gzip'}
+# Content-Type of the files in a unity build, by the suffix under the compression
+UNITY_TYPES = {
+    '.wasm': 'application/wasm',
+    '.js': 'application/javascript',
+    '.data': 'application/octet-stream',
+    '.symbols.json': 'application/octet-stream',
+    '.json': 'application/json',
+}
+UNITY_BROTLI_MARKER = b'UnityWeb Compressed Content (brotli)'
+SNIFF_SIZE = 64
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+# ---------------------------------------------------------------------------------------------------------
+# ENCODINGS
+# ---------------------------------------------------------------------------------------------------------
+def accepted_encodings(header):
+    '''
+    returns the codings an Accept-Encoding header allows, '*' included as is
+    '''
+    accepted = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        match = re.search(r'q=([0-9.]+)', params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                continue
+        if quality > 0:
+            accepted.add(coding)
+    return accepted
+
+
+def accepts(accepted, encoding):
+    return encoding in accepted or '*' in accepted
+
+
+def sniff_encoding(path):
+    '''
+    returns the compression of a .unityweb file, None when it is not compressed
+    '''
+    with open(path, 'rb') as file:
+        head = file.read(SNIFF_SIZE)
+    if head[:2] == b'\x1f\x8b':
+        return 'gzip'
+    if UNITY_BROTLI_MARKER in head:
+        return 'br'
+    return None
+
+
+def content_type(name):
+    '''
+    returns the Content-Type of a file named name once decompressed
+    '''
+    for suffix, value in UNITY_TYPES.items():
+        if name.endswith(suffix):
+            return value
+    guessed, _ = mimetypes.guess_type(name)
+    return guessed or 'application/octet-stream'
+
+
+def select_file(path, accepted):
+    '''
+    returns (file path, Content-Type, Content-Encoding) of the representation of
+    path to send, None when there is none the client accepts
+    '''
+    for suffix, encoding in ENCODINGS:
+        if path.endswith(suffix) and os.path.isfile(path):
+            if accepts(accepted, encoding):
+                return path, content_type(path[:-len(suffix)]), encoding
+            return path, OPAQUE_TYPES[encoding], None
+
+    if path.endswith('.unityweb') and os.path.isfile(path):
+        encoding = sniff_encoding(path)
+        inner = content_type(path[:-len('.unityweb')])
+        if encoding is None:
+            return path, inner, None
+        if accepts(accepted, encoding):
+            return path, inner, encoding
+        return path, OPAQUE_TYPES[encoding], None
+
+    for suffix, encoding in ENCODINGS:
+        if accepts(accepted, encoding) and os.path.isfile(path + suffix):
+            return path + suffix, content_type(path), encoding
+    if os.path.isfile(path):
+        return path, content_type(path), None
+    return None
+
+
+# ---------------------------------------------------------------------------------------------------------
+# RANGES
+# ---------------------------------------------------------------------------------------------------------
+def parse_range(header, size):
+    '''
+    returns (start, end) inclusive of a single byte range, None to send the
+    whole file (no range, or one this view does not handle), ValueError when
+    the range cannot be satisfied
+    '''
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # the last n bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end
+
+
+class FileRange:
+    '''
+    a file-like object reading length bytes of file from start
+    '''
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+# ---------------------------------------------------------------------------------------------------------
+# VIEW
+# ---------------------------------------------------------------------------------------------------------
+def get_etag(stat):
+    return '"{:x}-{:x}"'.format(stat.st_mtime_ns, stat.st_size)
+
+
+def not_modified(request, etag, mtime):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and int(mtime) <= since
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+
+    selected = select_file(fullpath, accepted_encodings(request.headers.get('Accept-Encoding', '')))
+    if selected is None:
+        raise Http404
+    filepath, mimetype, encoding = selected
+    stat = os.stat(filepath)
+    etag = get_etag(stat)
+
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Vary': 'Accept-Encoding',
+        'Accept-Ranges': 'bytes',
+    }
+    if path.startswith(IMMUTABLE_PREFIX):
+        headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+
+    if not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    byte_range = None
+    range_header = request.headers.get('Range')
+    # a range of a representation the client no longer has is ignored
+    if range_header and request.headers.get('If-Range', etag) == etag:
+        try:
+            byte_range = parse_range(range_header, stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{}'.format(stat.st_size)
+            return response
+
+    file = open(filepath, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=mimetype)
+        response['Content-Length'] = stat.st_size
+    else:
+        start, end = byte_range
+        response = FileResponse(FileRange(file, start, end - start + 1), status=206, content_type=mimetype)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, stat.st_size)
+    if encoding is not None:
+        response['Content-Encoding'] = encoding
+    for name, value in headers.items():
+        response[name] = value
+    return response
@@ -0,0 +1,17 @@
+from .cache import begin_request, end_request
+
+
+class SnapshotVersionMiddleware:
+    '''
+    Scopes snapshot version reads to the request, see dashboard.cache
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        begin_request()
+        try:
+            return self.get_response(request)
+        finally:
+            end_request()
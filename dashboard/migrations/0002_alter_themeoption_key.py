@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:06
+
+from django.db import migrations, models
+
+
+def remove_duplicate_keys(apps, schema_editor):
+    # keep the most recent row of every key before adding the unique index
+    ThemeOption = apps.get_model('dashboard', 'ThemeOption')
+    seen = set()
+    for obj in ThemeOption.objects.order_by('key', '-id'):
+        if obj.key in seen:
+            obj.delete()
+        else:
+            seen.add(obj.key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='themeoption',
+            name='key',
+            field=models.CharField(max_length=128, unique=True),
+        ),
+    ]
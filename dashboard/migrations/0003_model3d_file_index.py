@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_alter_themeoption_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='model3d',
+            name='file',
+            field=models.FileField(db_index=True, help_text='Please embed your textures into the 3D model file and use correct procedure.', upload_to='models', verbose_name='Panel 3D Model (.FBX, .gltf, .glb)'),
+        ),
+    ]
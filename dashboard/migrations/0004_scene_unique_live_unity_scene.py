@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:12
+
+from django.db import migrations, models
+
+
+def detach_shared_unity_scenes(apps, schema_editor):
+    # keep the unity scene on the newest live scene using it
+    Scene = apps.get_model('dashboard', 'Scene')
+    seen = set()
+    scenes = Scene.objects.filter(deleted_at__isnull=True, unity_scene__isnull=False)
+    for scene in scenes.order_by('unity_scene', '-id'):
+        if scene.unity_scene_id in seen:
+            Scene.objects.filter(id=scene.id).update(unity_scene=None)
+        else:
+            seen.add(scene.unity_scene_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_model3d_file_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(detach_shared_unity_scenes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='scene',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True)), fields=('unity_scene',), name='unique_live_scene_unity_scene'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models.functions import Upper
+
+# Indexes behind dashboard.search. They only exist on PostgreSQL and are kept
+# out of the model state, so other databases never try to build them.
+# The vectors must stay identical to SEARCH_TYPES in dashboard/search.py.
+
+SEARCH_INDEXES = {
+    'scene': (
+        'title',
+        (('title', 'A'), ('subtitle', 'B'), ('description', 'C')),
+    ),
+    'sector': (
+        'name',
+        (('name', 'A'), ('description', 'C')),
+    ),
+    'productpanel': (
+        'display_text',
+        (('display_text', 'A'), ('product_description', 'B'), ('asset', 'C'),
+         ('vendor', 'C'), ('asset_description', 'D')),
+    ),
+}
+
+
+def search_indexes(model_name):
+    name_field, fields = SEARCH_INDEXES[model_name]
+    vector = None
+    for name, weight in fields:
+        field_vector = SearchVector(name, weight=weight, config='english')
+        vector = field_vector if vector is None else vector + field_vector
+    return [
+        GinIndex(vector, name='{}_search_vector_idx'.format(model_name)),
+        GinIndex(OpClass(Upper(name_field), name='gin_trgm_ops'), name='{}_name_trgm_idx'.format(model_name)),
+    ]
+
+
+def add_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name in SEARCH_INDEXES:
+        model = apps.get_model('dashboard', model_name)
+        for index in search_indexes(model_name):
+            schema_editor.add_index(model, index)
+
+
+def remove_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name in SEARCH_INDEXES:
+        model = apps.get_model('dashboard', model_name)
+        for index in search_indexes(model_name):
+            schema_editor.remove_index(model, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_scene_unique_live_unity_scene'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(add_search_indexes, remove_search_indexes),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0005_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='audittrail',
+            index=models.Index(fields=['-created_at', '-id'], name='audit_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productpanel',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at', '-id'], name='product_live_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producttier1',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at', '-id'], name='tier1_live_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scene',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['priority', '-created_at', '-id'], name='scene_live_order_idx'),
+        ),
+    ]
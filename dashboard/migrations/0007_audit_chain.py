@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def link_audit_chain(apps, schema_editor):
+    # point every existing audit at the one before it for the same object
+    AuditTrail = apps.get_model('dashboard', 'AuditTrail')
+    heads = {}
+    batch = []
+    rows = AuditTrail.objects.order_by('id').values_list('id', 'model_type', 'object_id')
+    for id, model_type, object_id in rows.iterator(chunk_size=2000):
+        previous_id = heads.get((model_type, object_id))
+        heads[(model_type, object_id)] = id
+        if previous_id is not None:
+            batch.append(AuditTrail(id=id, previous_id=previous_id))
+        if len(batch) >= 1000:
+            AuditTrail.objects.bulk_update(batch, ['previous'])
+            batch = []
+    if batch:
+        AuditTrail.objects.bulk_update(batch, ['previous'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_list_cursor_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audittrail',
+            name='previous',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='dashboard.audittrail'),
+        ),
+        migrations.AddIndex(
+            model_name='audittrail',
+            index=models.Index(fields=['model_type', 'object_id', '-id'], name='audit_object_history_idx'),
+        ),
+        migrations.RunPython(link_audit_chain, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,118 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:25
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Rebuilds dashboard_audittrail as a table range partitioned by month on
+# created_at (PostgreSQL only). The primary key becomes (id, created_at), as a
+# partitioned table requires, and the other indexes and foreign keys are
+# recreated under their current names. dashboard/audit_archive.py maintains the
+# partitions afterwards; the naming here must stay identical to it.
+
+AUDIT_TABLE = 'dashboard_audittrail'
+PARTITIONS_AHEAD = 3
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def month_start(month):
+    return datetime.datetime(month.year, month.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def rebuild_audit_table(schema_editor, partitioned):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    quote = connection.ops.quote_name
+    table = quote(AUDIT_TABLE)
+    old_table = quote(AUDIT_TABLE + '_old')
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s '
+            'AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass)',
+            [AUDIT_TABLE, AUDIT_TABLE],
+        )
+        indexes = [row[0].replace(' ON ONLY ', ' ON ') for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [AUDIT_TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute('SELECT MIN(created_at) FROM {}'.format(table))
+        oldest = cursor.fetchone()[0]
+
+        cursor.execute('ALTER TABLE {} RENAME TO {}'.format(table, old_table))
+        cursor.execute('CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS){}'.format(
+            table, old_table, ' PARTITION BY RANGE (created_at)' if partitioned else ''))
+        # the old id sequence goes with the old table, see below
+        cursor.execute('ALTER TABLE {} ALTER COLUMN id DROP DEFAULT'.format(table))
+
+        if partitioned:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            month = datetime.date(now.year, now.month, 1)
+            last = add_months(month, PARTITIONS_AHEAD)
+            if oldest is not None:
+                oldest = oldest.astimezone(datetime.timezone.utc)
+                month = min(month, datetime.date(oldest.year, oldest.month, 1))
+            while month <= last:
+                cursor.execute(
+                    "CREATE TABLE {} PARTITION OF {} FOR VALUES FROM ('{}') TO ('{}')".format(
+                        quote('{}_p{:%Y%m}'.format(AUDIT_TABLE, month)), table,
+                        month_start(month).isoformat(), month_start(add_months(month, 1)).isoformat())
+                )
+                month = add_months(month, 1)
+            cursor.execute('CREATE TABLE {} PARTITION OF {} DEFAULT'.format(
+                quote(AUDIT_TABLE + '_default'), table))
+
+        cursor.execute('INSERT INTO {} SELECT * FROM {}'.format(table, old_table))
+        cursor.execute('DROP TABLE {}'.format(old_table))
+        # a plain owned sequence, identity columns on partitioned tables need PostgreSQL 17
+        sequence = quote(AUDIT_TABLE + '_id_seq')
+        cursor.execute('CREATE SEQUENCE {} OWNED BY {}.id'.format(sequence, table))
+        cursor.execute("ALTER TABLE {} ALTER COLUMN id SET DEFAULT nextval('{}')".format(table, sequence))
+        cursor.execute('ALTER TABLE {} ADD PRIMARY KEY ({})'.format(
+            table, 'id, created_at' if partitioned else 'id'))
+        for definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute('ALTER TABLE {} ADD CONSTRAINT {} {}'.format(table, quote(name), definition))
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {}".format(table),
+            [AUDIT_TABLE],
+        )
+
+
+def partition_audit_trail(apps, schema_editor):
+    rebuild_audit_table(schema_editor, partitioned=True)
+
+
+def unpartition_audit_trail(apps, schema_editor):
+    rebuild_audit_table(schema_editor, partitioned=False)
+    # the foreign key comes back, drop pointers to archived audits first
+    AuditTrail = apps.get_model('dashboard', 'AuditTrail')
+    AuditTrail.objects.exclude(previous__isnull=True).exclude(
+        previous_id__in=AuditTrail.objects.values('id'),
+    ).update(previous=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_audit_chain'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='audittrail',
+            name='previous',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='dashboard.audittrail'),
+        ),
+        migrations.RunPython(partition_audit_trail, unpartition_audit_trail),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:28
+
+from django.contrib.postgres.indexes import GinIndex
+from django.db import migrations, models
+
+# GIN index over audittrail.changes for "what changed" lookups such as
+# changes__has_key='title'. PostgreSQL only, kept out of the model state like
+# the search indexes of 0005.
+
+CHANGES_INDEX = GinIndex(fields=['changes'], name='audit_changes_gin_idx')
+
+
+def add_changes_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.add_index(apps.get_model('dashboard', 'AuditTrail'), CHANGES_INDEX)
+
+
+def remove_changes_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.remove_index(apps.get_model('dashboard', 'AuditTrail'), CHANGES_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0008_audit_partitions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audittrail',
+            name='changes',
+            field=models.JSONField(null=True),
+        ),
+        migrations.RunPython(add_changes_index, remove_changes_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0009_audit_changes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audittrail',
+            name='fields',
+            field=models.JSONField(null=True),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:33
+
+from django.db import migrations, models
+
+
+def mark_extracted(apps, schema_editor):
+    # unity scenes so far were extracted inside their upload request
+    UnityScene = apps.get_model('dashboard', 'UnityScene')
+    UnityScene.objects.update(extraction_status='READY', extraction_progress=100)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0010_audit_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='unityscene',
+            name='extraction_bytes',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='unityscene',
+            name='extraction_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='unityscene',
+            name='extraction_progress',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='unityscene',
+            name='extraction_status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('EXTRACTING', 'Extracting'), ('READY', 'Ready'), ('FAILED', 'Failed')], default='PENDING', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='unityscene',
+            name='extraction_total_bytes',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='unityscene',
+            name='extraction_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_extracted, migrations.RunPython.noop),
+    ]
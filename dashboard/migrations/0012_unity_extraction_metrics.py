@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0011_unity_extraction_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='unityscene',
+            name='extraction_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
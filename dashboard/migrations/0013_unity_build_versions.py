@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0012_unity_extraction_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='unityscene',
+            name='build_version',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='unityscene',
+            name='previous_build_version',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
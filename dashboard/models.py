@@ -6,6 +6,7 @@ from django.db import IntegrityError, models
 from django.utils import timezone
 from slugify import slugify
 
+from .cache import get_singleton
 from .services import get_random_position
 
 
@@ -25,11 +26,33 @@ class AuditTrail(models.Model):
     object_str = models.CharField("Model Str", max_length=255)
     action = models.CharField(max_length=255)
     ip = models.GenericIPAddressField(null=True)
+    # full state on keyframes only, see dashboard/audit_snapshots.py
     instance = models.JSONField(null=True)
+    # written by audits from before changes existed
     previous_instance = models.JSONField(null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # {field: [old, new]} against the previous audit
+    changes = models.JSONField(null=True)
+    # {field: label} when one audit covers several fields set by a request
+    fields = models.JSONField(null=True)
+    # the audit written before this one for the same (model_type, object_id).
+    # no database constraint: the table is partitioned on postgres and the
+    # previous audit may have been archived (dashboard/audit_archive.py), the
+    # pointer is left dangling then so the history still reaches the archive
+    previous = models.ForeignKey("self", null=True, blank=True, on_delete=models.DO_NOTHING,
+                                 related_name="+", db_constraint=False)
+    # when the change was made: set by build_audit, the background writer may
+    # insert it much later
+    created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # cursor pagination of the audit list
+            models.Index(fields=["-created_at", "-id"], name="audit_created_id_idx"),
+            # chain heads and object history
+            models.Index(fields=["model_type", "object_id", "-id"], name="audit_object_history_idx"),
+        ]
+
     def __str__(self):
         return str(self.model_type)
 
@@ -360,6 +383,22 @@ class Scene(DateTimeModel):
         ordering = ["priority", "-created_at"]
         verbose_name = "Scene"
         verbose_name_plural = "Scenes"
+        indexes = [
+            # cursor pagination of the scene list
+            models.Index(
+                fields=["priority", "-created_at", "-id"],
+                condition=models.Q(deleted_at__isnull=True),
+                name="scene_live_order_idx",
+            ),
+        ]
+        constraints = [
+            # a unity scene belongs to at most one live scene
+            models.UniqueConstraint(
+                fields=["unity_scene"],
+                condition=models.Q(deleted_at__isnull=True),
+                name="unique_live_scene_unity_scene",
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -447,6 +486,32 @@ class UnityScene(DateTimeModel):
         ],
     )
 
+    # extraction of unity_file into a versioned build, run by dashboard/extraction.py
+    EXTRACTION_PENDING = "PENDING"
+    EXTRACTION_EXTRACTING = "EXTRACTING"
+    EXTRACTION_READY = "READY"
+    EXTRACTION_FAILED = "FAILED"
+    extraction_status = models.CharField(
+        max_length=20,
+        choices=(
+            (EXTRACTION_PENDING, "Pending"),
+            (EXTRACTION_EXTRACTING, "Extracting"),
+            (EXTRACTION_READY, "Ready"),
+            (EXTRACTION_FAILED, "Failed"),
+        ),
+        default=EXTRACTION_PENDING,
+    )
+    extraction_progress = models.PositiveSmallIntegerField(default=0)
+    extraction_bytes = models.BigIntegerField(default=0)
+    extraction_total_bytes = models.BigIntegerField(null=True, blank=True)
+    extraction_error = models.TextField(blank=True, default="")
+    extraction_started_at = models.DateTimeField(null=True, blank=True)
+    # heartbeat of the running job, a stale one is picked up again
+    extraction_updated_at = models.DateTimeField(null=True, blank=True)
+    # active build under media/unity/builds and the one it replaced, for rollback
+    build_version = models.CharField(max_length=100, blank=True, default="")
+    previous_build_version = models.CharField(max_length=100, blank=True, default="")
+
     class Meta:
         ordering = ["name"]
         verbose_name = "Unity Scene"
@@ -571,6 +636,13 @@ class ProductTier1(DateTimeModel):
         ordering = ["-created_at"]
         verbose_name = "ProductTier1"
         verbose_name_plural = "ProductsTier1"
+        indexes = [
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(deleted_at__isnull=True),
+                name="tier1_live_created_idx",
+            ),
+        ]
 
     def __str__(self):
         name = (
@@ -718,6 +790,15 @@ class ProductPanel(DateTimeModel):
         default="DRAFT",
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(deleted_at__isnull=True),
+                name="product_live_created_idx",
+            ),
+        ]
+
     def __str__(self) -> str:
         if self.service:
             return "{} -> {}".format(self.service.name, self.display_text)
@@ -822,6 +903,8 @@ class Model3D(DateTimeModel):
         "Panel 3D Model (.FBX, .gltf, .glb)",
         upload_to="models",
         help_text="Please embed your textures into the 3D model file and use correct procedure.",
+        # products keep a copy of the path, they are matched back through this index
+        db_index=True,
     )
     # states = models.ManyToManyField(to=Model3DState, related_name='states', null=True, blank=True)
     # emotes = models.ManyToManyField(to=Model3DEmote, related_name='emotes', null=True, blank=True)
@@ -948,13 +1031,12 @@ class SiteConfig(DateTimeModel):
 
     @staticmethod
     def get_instance():
-        if SiteConfig.has_object():
-            return SiteConfig.objects.first()
-        return SiteConfig()
+        # the row is created on first read, as every view used to do
+        return get_singleton(SiteConfig, create=True)
 
     @staticmethod
     def has_object():
-        return SiteConfig.objects.all().count() > 0
+        return SiteConfig.get_instance().pk is not None
 
 
 class SceneGroup(DateTimeModel):
@@ -1023,13 +1105,11 @@ class HomePageOption(DateTimeModel):
 
     @staticmethod
     def get_instance():
-        if HomePageOption.objects.first():
-            return HomePageOption.objects.first()
-        return HomePageOption()
+        return get_singleton(HomePageOption)
 
     @staticmethod
     def has_object():
-        return HomePageOption.objects.all().count() > 0
+        return HomePageOption.get_instance().pk is not None
 
 
 class ShareIcon(DateTimeModel):
@@ -1055,18 +1135,16 @@ class ShareIcon(DateTimeModel):
 
     @staticmethod
     def get_instance():
-        if ShareIcon.objects.first():
-            return ShareIcon.objects.first()
-        return ShareIcon()
+        return get_singleton(ShareIcon)
 
     @staticmethod
     def has_object():
-        return ShareIcon.objects.all().count() > 0
+        return ShareIcon.get_instance().pk is not None
 
 
 # Theme Option
 class ThemeOption(DateTimeModel):
-    key = models.CharField(max_length=128)
+    key = models.CharField(max_length=128, unique=True)
     value = models.TextField()
 
     class Meta:
@@ -1100,10 +1178,8 @@ class FilterIcon(DateTimeModel):
 
     @staticmethod
     def get_instance():
-        if FilterIcon.objects.first():
-            return FilterIcon.objects.first()
-        return FilterIcon()
+        return get_singleton(FilterIcon)
 
     @staticmethod
     def has_object():
-        return FilterIcon.objects.all().count() > 0
+        return FilterIcon.get_instance().pk is not None
@@ -0,0 +1,146 @@
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .counts import get_total
+
+
+class CountedLimitOffsetPagination(LimitOffsetPagination):
+    '''
+    LimitOffsetPagination whose count comes from dashboard.counts.
+    count_exact is False when the count is a planner estimate.
+    '''
+    default_limit = 10
+
+    def get_count(self, queryset):
+        count, self.count_exact = get_total(queryset)
+        return count
+
+
+class ArchivePagination(LimitOffsetPagination):
+    '''
+    LimitOffsetPagination over an archived month (dashboard.audit_archive.ArchivedMonth)
+    '''
+    default_limit = 10
+    count_exact = True
+
+
+class KeysetPagination(BasePagination):
+    '''
+    Cursor pagination over a fixed composite ordering, e.g. ('-created_at', '-id').
+    The cursor holds the ordering values of the row the page starts after, so a
+    deep page is the same index range scan as the first one. No count is run.
+    The last ordering field must be unique.
+    '''
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    default_limit = 10
+    max_limit = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering):
+        self.ordering = ordering
+        self.fields = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+        self.count = None
+        self.count_exact = None
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        return min(max(limit, 1), self.max_limit)
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return False, None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self.fields, data['p'], strict=True)
+            ]
+            return bool(data.get('r')), values
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj, reverse):
+        values = []
+        for name, _ in self.fields:
+            value = getattr(obj, name)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        data = {'p': values, 'r': 1} if reverse else {'p': values}
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+    def after(self, values, reverse):
+        '''
+        rows strictly after values in the (possibly reversed) ordering
+        '''
+        condition = Q()
+        equal = {}
+        for (name, descending), value in zip(self.fields, values):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= Q(**equal, **{'{}__{}'.format(name, lookup): value})
+            equal[name] = value
+        # bound on the leading column so the index range scan starts at the cursor
+        name, descending = self.fields[0]
+        bound = Q(**{'{}__{}'.format(name, 'lte' if descending != reverse else 'gte'): values[0]})
+        return bound & condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.reverse, values = self.decode_cursor(request, queryset.model)
+
+        if self.reverse:
+            ordering = [name[1:] if name.startswith('-') else '-' + name for name in self.ordering]
+        else:
+            ordering = self.ordering
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self.after(values, self.reverse))
+
+        rows = list(queryset[:self.limit + 1])
+        has_more = len(rows) > self.limit
+        rows = rows[:self.limit]
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+        self.page = rows
+        return rows
+
+    def get_link(self, cursor):
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        if cursor is None:
+            return remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.get_link(self.encode_cursor(self.page[-1], False))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.get_link(self.encode_cursor(self.page[0], True))
+
+
+def get_paginator(request, ordering):
+    '''
+    returns the list pagination for request: CountedLimitOffsetPagination, or
+    KeysetPagination over ordering when the client opts in with ?pagination=cursor
+    (or follows a cursor link). paginator.count is None in cursor mode.
+    '''
+    params = request.query_params
+    if params.get('pagination') == 'cursor' or KeysetPagination.cursor_query_param in params:
+        return KeysetPagination(ordering)
+    return CountedLimitOffsetPagination()
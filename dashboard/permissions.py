@@ -1,33 +1,52 @@
 from rest_framework import permissions
 
+from .cache import get_or_load, invalidate
+
 # from django.contrib.auth.models import Group
 
-class SuperAdminPermission(permissions.BasePermission):
-    def has_permission(self, request, view):
-        required_group = 'Superadmin'
-        return request.user.groups.filter(name=required_group).exists()
+USER_ROLES_KEY = 'user-roles:{}'
 
-class UberAdminPermission(permissions.BasePermission):
-    def has_permission(self, request, view):
-        required_group = 'Uberadmin'
-        return request.user.groups.filter(name=required_group).exists()
-    
-class DeveloperPermission(permissions.BasePermission):
-    def has_permission(self, request, view):
-        required_group = 'Developer'
-        return request.user.groups.filter(name=required_group).exists()
 
-class ExperienceDesignerPermission(permissions.BasePermission):
-    def has_permission(self, request, view):
-        required_group = 'Experience Designer'
-        return request.user.groups.filter(name=required_group).exists()
+def get_user_roles(user):
+    '''
+    returns the group names of user.
+    loaded once per request and kept per user id across requests,
+    invalidated when the user's groups change (see dashboard.signals)
+    '''
+    if user is None or not user.is_authenticated:
+        return frozenset()
+    if not hasattr(user, '_role_names'):
+        user._role_names = get_or_load(
+            USER_ROLES_KEY.format(user.pk),
+            lambda: frozenset(user.groups.values_list('name', flat=True)),
+        )
+    return user._role_names
+
+
+def invalidate_user_roles(user_id):
+    invalidate(USER_ROLES_KEY.format(user_id))
+
+
+class GroupPermission(permissions.BasePermission):
+    required_group = None
 
-class ViewerPermission(permissions.BasePermission):
-    def has_permission(self, request, view):
-        required_group = 'Viewer'
-        return request.user.groups.filter(name=required_group).exists()
-    
-class ProductManagerPermission(permissions.BasePermission):
     def has_permission(self, request, view):
-        required_group = 'Product Manager'
-        return request.user.groups.filter(name=required_group).exists()
+        return self.required_group in get_user_roles(request.user)
+
+class SuperAdminPermission(GroupPermission):
+    required_group = 'Superadmin'
+
+class UberAdminPermission(GroupPermission):
+    required_group = 'Uberadmin'
+
+class DeveloperPermission(GroupPermission):
+    required_group = 'Developer'
+
+class ExperienceDesignerPermission(GroupPermission):
+    required_group = 'Experience Designer'
+
+class ViewerPermission(GroupPermission):
+    required_group = 'Viewer'
+
+class ProductManagerPermission(GroupPermission):
+    required_group = 'Product Manager'
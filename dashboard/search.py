@@ -0,0 +1,118 @@
+import base64
+import json
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank, SearchVector,
+                                            TrigramSimilarity)
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import ProductPanel, Scene, Sector
+from .serializers import (ProductSearchSerializer, SceneCategorySearchSerializer,
+                          SceneSearchSerializer)
+
+# Catalog search.
+# On PostgreSQL every type is matched with a weighted full text vector plus a
+# substring match on its name, both backed by GIN indexes created in
+# migration 0005 (the vectors there must stay identical to the ones below).
+# Other databases (sqlite test runs) fall back to icontains over the same columns.
+
+SEARCH_CONFIG = 'english'
+SEARCH_LIMIT = 5
+SEARCH_MAX_LIMIT = 50
+
+
+class SearchError(Exception):
+    pass
+
+
+class SearchType:
+    def __init__(self, model, name_field, fields, serializer):
+        self.model = model
+        self.name_field = name_field
+        # (column, weight) pairs of the search vector
+        self.fields = fields
+        self.serializer = serializer
+
+    def vector(self):
+        vector = None
+        for name, weight in self.fields:
+            field_vector = SearchVector(name, weight=weight, config=SEARCH_CONFIG)
+            vector = field_vector if vector is None else vector + field_vector
+        return vector
+
+    def queryset(self, key):
+        queryset = self.model.objects.filter(deleted_at__isnull=True)
+        name_match = Q(**{'{}__icontains'.format(self.name_field): key})
+
+        if connection.vendor == 'postgresql':
+            query = SearchQuery(key, config=SEARCH_CONFIG, search_type='websearch')
+            vector = self.vector()
+            return queryset.annotate(search=vector).filter(
+                Q(search=query) | name_match
+            ).annotate(
+                rank=SearchRank(vector, query) + TrigramSimilarity(self.name_field, key)
+            ).order_by('-rank', 'id')
+
+        match = Q()
+        for name, weight in self.fields:
+            match |= Q(**{'{}__icontains'.format(name): key})
+        return queryset.filter(match).annotate(
+            rank=Case(
+                When(**{'{}__istartswith'.format(self.name_field): key}, then=Value(2)),
+                When(name_match, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        ).order_by('-rank', 'id')
+
+
+SEARCH_TYPES = {
+    'scene': SearchType(
+        Scene, 'title',
+        (('title', 'A'), ('subtitle', 'B'), ('description', 'C')),
+        SceneSearchSerializer,
+    ),
+    'scene_category': SearchType(
+        Sector, 'name',
+        (('name', 'A'), ('description', 'C')),
+        SceneCategorySearchSerializer,
+    ),
+    'product': SearchType(
+        ProductPanel, 'display_text',
+        (('display_text', 'A'), ('product_description', 'B'), ('asset', 'C'),
+         ('vendor', 'C'), ('asset_description', 'D')),
+        ProductSearchSerializer,
+    ),
+}
+
+
+def encode_cursor(type_name, offset):
+    data = json.dumps({'type': type_name, 'offset': offset}).encode()
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        type_name, offset = data['type'], int(data['offset'])
+    except (ValueError, TypeError, KeyError):
+        raise SearchError('invalid cursor')
+    if type_name not in SEARCH_TYPES or offset < 0:
+        raise SearchError('invalid cursor')
+    return type_name, offset
+
+
+def search(key, types=None, limit=SEARCH_LIMIT, offset=0):
+    '''
+    returns ({type: cards}, {type: next cursor or None}) for key,
+    ranked best match first, at most limit cards per type
+    '''
+    results = {}
+    cursors = {}
+    for type_name in types or SEARCH_TYPES:
+        search_type = SEARCH_TYPES[type_name]
+        rows = list(search_type.queryset(key)[offset:offset + limit + 1])
+        has_next = len(rows) > limit
+        results[type_name] = search_type.serializer(rows[:limit], many=True).data
+        cursors[type_name] = encode_cursor(type_name, offset + limit) if has_next else None
+    return results, cursors
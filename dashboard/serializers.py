@@ -9,9 +9,12 @@ from rest_framework import serializers
 
 from .models import (CallToActionPro, FilterIcon, HomePageOption, ProductPanel,
                      ProductTier1, Scene, Sector, SiteConfig, UnityScene, User, FileLibrary, Model3D, AuditTrail, ActionType, ShareIcon, SceneGroup, UnitySceneVersion)
+from .loaders import BatchRelationListSerializer
 from .services import get_random_position
-from .utils import reset_user_password, extract_unity_file
-from django.db import transaction
+from .extraction import build_url, link_build, schedule_extraction
+from .utils import reset_user_password
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
 from django.core.exceptions import ValidationError
 
 
@@ -137,10 +140,35 @@ class UserUpdateSerializer(serializers.ModelSerializer):
 # AUDIT SERIALIZERS
 #--------------------------------------------------------------------------------
 
+class AuditTrailListSerializer(serializers.ListSerializer):
+    '''
+    expands an audit covering several fields (AuditTrail.fields) into one entry
+    per field, with its old and new value. audits may be archived dicts
+    '''
+
+    def to_representation(self, data):
+        entries = []
+        for audit in data:
+            entry = self.child.to_representation(audit)
+            if isinstance(audit, dict):
+                fields, changes = audit.get('fields'), audit.get('changes')
+            else:
+                fields, changes = audit.fields, audit.changes
+            if not fields:
+                entries.append(entry)
+                continue
+            changes = changes or {}
+            for name, label in fields.items():
+                old, new = changes.get(name, (None, None))
+                entries.append({**entry, 'object_str': label, 'field': name, 'old': old, 'new': new})
+        return entries
+
+
 class AuditTrailSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
     class Meta:
         model = AuditTrail
+        list_serializer_class = AuditTrailListSerializer
         fields = [
             "id",
             "user",
@@ -155,6 +183,27 @@ class AuditTrailSerializer(serializers.ModelSerializer):
             "updated_at",
         ]
 
+
+class AuditHistorySerializer(serializers.ModelSerializer):
+    user = serializers.StringRelatedField(read_only=True)
+    # set by AuditHistoryView on ?state=true, left out otherwise
+    state = serializers.JSONField(read_only=True)
+    class Meta:
+        model = AuditTrail
+        fields = [
+            "id",
+            "previous",
+            "user",
+            "model_type",
+            "object_id",
+            "object_str",
+            "action",
+            "ip",
+            "changes",
+            "state",
+            "created_at",
+        ]
+
 #--------------------------------------------------------------------------------
 # SCENES CATEGORIES SERIALIZERS
 #--------------------------------------------------------------------------------
@@ -256,6 +305,8 @@ class UnitySceneDropdownSerializer(serializers.ModelSerializer):
         ]
 
 class UnitySceneSerializer(serializers.ModelSerializer):
+    build_url = serializers.SerializerMethodField()
+
     class Meta:
         model = UnityScene
         fields = [
@@ -267,7 +318,13 @@ class UnitySceneSerializer(serializers.ModelSerializer):
             "background_image",
             "loading_text",
             "unity_file",
+            "extraction_status",
+            "build_url",
         ]
+        read_only_fields = ["extraction_status"]
+
+    def get_build_url(self, obj):
+        return build_url(obj)
 
     def update(self, instance, validated_data):
         instance = self.instance
@@ -276,16 +333,24 @@ class UnitySceneSerializer(serializers.ModelSerializer):
             instance.background_image = background_image
         elif background_image == '':
             instance.background_image = None
-        return super().update(instance, validated_data)
+        name = instance.name
+        instance = super().update(instance, validated_data)
+        if validated_data.get('unity_file'):
+            schedule_extraction(instance)
+        elif instance.name != name and instance.build_version:
+            link_build(instance.name, instance.build_version)
+        return instance
 
 class UnitySceneCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = UnityScene
-        fields = ["name", "unity_file", "background_image", "loading_text"]
+        fields = ["id", "name", "unity_file", "background_image", "loading_text", "extraction_status"]
+        read_only_fields = ["id", "extraction_status"]
 
     def create(self, validated_data):
         data = super().create(validated_data)
-        extract_unity_file(data)
+        # extracted in the background, poll unity-scenes/<id>/status
+        schedule_extraction(data)
         return data
     
 #--------------------------------------------------------------------------------
@@ -373,6 +438,37 @@ class ProductSerializer(serializers.ModelSerializer):
             "subcategory"
         ]
 
+def resolve_model_3ds(paths):
+    '''
+    returns {stored file path: Model3D} for paths, in one indexed query
+    '''
+    paths = {path for path in paths if path}
+    if not paths:
+        return {}
+    return {obj.file.name: obj for obj in Model3D.objects.filter(file__in=paths)}
+
+
+class Model3DPathSerializerMixin:
+    '''
+    renders the model_3d file of a product as the Model3D stored at the same path.
+    list serializers resolve the whole page at once through preload()
+    '''
+
+    def preload(self, instances):
+        model_3ds = resolve_model_3ds(obj.model_3d.name for obj in instances)
+        for obj in instances:
+            obj._model_3d_object = model_3ds.get(obj.model_3d.name)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if instance.model_3d:
+            if not hasattr(instance, '_model_3d_object'):
+                self.preload([instance])
+            model_3d = instance._model_3d_object
+            data['model_3d'] = ProductCategoryModel3DSerializer(model_3d).data if model_3d else None
+        return data
+
+
 class ProductCategoryDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductTier1
@@ -381,7 +477,7 @@ class ProductCategoryDetailSerializer(serializers.ModelSerializer):
             'name'
         ]
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductDetailSerializer(Model3DPathSerializerMixin, serializers.ModelSerializer):
     product_category = ProductCategoryDetailSerializer(source='service')
     hyper_link = serializers.CharField(source='hyperlink')
     name = serializers.CharField(source='display_text')
@@ -415,19 +511,8 @@ class ProductDetailSerializer(serializers.ModelSerializer):
             "product_category",
             "subcategory"
         ]
-
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        model_3d_path = data.get('model_3d')
-        if model_3d_path:
-            path = model_3d_path.replace('/media/','')
-            try:
-                model_3d = Model3D.objects.get(file__exact=path)
-                serializer = ProductCategoryModel3DSerializer(model_3d)
-                data['model_3d'] = serializer.data
-            except Model3D.DoesNotExist:
-                data['model_3d'] = None
-        return data
+        list_serializer_class = BatchRelationListSerializer
+        batch_relations = ('service',)
 
 class ProductAddUpdateSerializer(serializers.ModelSerializer):
     name = serializers.CharField(source='display_text')
@@ -528,6 +613,18 @@ class ProductCategoryDropdownSerializer(serializers.ModelSerializer):
         ]
 
 
+def related_products_prefetch(lookup='product_panels'):
+    '''
+    prefetch for ProductCategoriesSerializer.related_products,
+    lookup is the path to ProductTier1.product_panels from the queried model
+    '''
+    return Prefetch(
+        lookup,
+        queryset=ProductPanel.objects.filter(deleted_at__isnull=True).prefetch_related('subcategory'),
+        to_attr='active_product_panels',
+    )
+
+
 class ProductCategoriesSerializer(serializers.ModelSerializer):
     related_products = serializers.SerializerMethodField()
     class Meta:
@@ -552,7 +649,9 @@ class ProductCategoriesSerializer(serializers.ModelSerializer):
         ]
 
     def get_related_products(self, obj):
-        related_products = ProductPanel.objects.filter(service=obj.id, deleted_at__isnull=True)
+        related_products = getattr(obj, 'active_product_panels', None)
+        if related_products is None:
+            related_products = ProductPanel.objects.filter(service=obj.id, deleted_at__isnull=True)
         serializer = ProductSerializer(related_products, many=True)
         if serializer.data:
             return serializer.data
@@ -733,7 +832,7 @@ class ProductCategoryModel3DSerializer(serializers.ModelSerializer):
         return data
 
 
-class ProductCategoriesDetailSerializer(serializers.ModelSerializer):
+class ProductCategoriesDetailSerializer(Model3DPathSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ProductTier1
@@ -754,19 +853,7 @@ class ProductCategoriesDetailSerializer(serializers.ModelSerializer):
             "position_y",
             "sector"
         ]
-        
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        model_3d_path = data.get('model_3d')
-        if model_3d_path:
-            path = model_3d_path.replace('/media/','')
-            try:
-                model_3d = Model3D.objects.get(file__exact=path)
-                serializer = ProductCategoryModel3DSerializer(model_3d)
-                data['model_3d'] = serializer.data
-            except Model3D.DoesNotExist:
-                data['model_3d'] = None
-        return data
+        list_serializer_class = BatchRelationListSerializer
               
 
 #--------------------------------------------------------------------------------
@@ -956,14 +1043,14 @@ class SceneSerializer(serializers.ModelSerializer):
             # "geography",
             "scene_group",
         ]
+        list_serializer_class = BatchRelationListSerializer
+        batch_relations = ('unity_scene', 'scene_group')
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        scene_group_id = data.get('scene_group')
         data.pop('scene_group')
-        if scene_group_id:
-            sceneGroup = SceneGroup.objects.get(id=scene_group_id)
-            serializer = SceneGroupSerializer(sceneGroup)
+        if instance.scene_group_id:
+            serializer = SceneGroupSerializer(instance.scene_group)
             data['scene_group'] = serializer.data
         else:
             data['scene_group'] = None
@@ -987,15 +1074,16 @@ class SceneCategorySerializer(serializers.ModelSerializer):
             "priority",
             "scene_group",
         ]
+        list_serializer_class = BatchRelationListSerializer
+        batch_relations = ('unity_scene', 'scene_group')
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        scene_group_id = data.pop('scene_group')
+        data.pop('scene_group')
         priority = data.get('priority')
 
-        if scene_group_id:
-            sceneGroup = SceneGroup.objects.get(id=scene_group_id)
-            serializer = SceneGroupSerializer(sceneGroup)
+        if instance.scene_group_id:
+            serializer = SceneGroupSerializer(instance.scene_group)
             data['scene_group'] = {
                 'id':serializer.data['id'],
                 'name':serializer.data['name'],
@@ -1026,24 +1114,21 @@ class SceneSerializerImmersiveON(serializers.ModelSerializer):
             "scene_group",
             "immersive_default_scene"
         ]
+        list_serializer_class = BatchRelationListSerializer
+        batch_relations = ('unity_scene', 'scene_group')
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        settings = SiteConfig.objects.first()
-        scene_group_id = data.get('scene_group')
+        settings = SiteConfig.get_instance()
         data.pop('scene_group')
 
-        if scene_group_id:
-            sceneGroup = SceneGroup.objects.get(id=scene_group_id)
-            serializer = SceneGroupSerializer(sceneGroup)
+        if instance.scene_group_id:
+            serializer = SceneGroupSerializer(instance.scene_group)
             data['scene_group'] = serializer.data
         else:
             data['scene_group'] = None
 
-        if not settings:
-            settings = SiteConfig.objects.create()
-
-        scene_id = settings.default_scene.id
+        scene_id = settings.default_scene_id
         id = data.get('id')
         if scene_id == id:
             data['immersive_default_scene'] = True
@@ -1052,6 +1137,31 @@ class SceneSerializerImmersiveON(serializers.ModelSerializer):
 
         return data
 
+UNITY_SCENE_IN_USE = "unity_scene with this id is already associated with a scene"
+
+
+def unity_scene_in_use(unity_scene, scene=None):
+    '''
+    True if a live scene other than scene uses unity_scene
+    '''
+    scenes = Scene.objects.filter(deleted_at__isnull=True, unity_scene=unity_scene)
+    if scene is not None:
+        scenes = scenes.exclude(id=scene.id)
+    return scenes.exists()
+
+
+def scene_detail_queryset():
+    '''
+    scenes with every relation SceneDetailSerializer renders,
+    loaded with a fixed number of queries
+    '''
+    return Scene.objects.select_related('unity_scene', 'unity_scene_version').prefetch_related(
+        related_products_prefetch('tech_and_digital_services_tier_1__product_panels'),
+        Prefetch('call_to_actions', queryset=CallToActionPro.objects.select_related('action_type')),
+        'sectors_and_departments',
+    )
+
+
 class SceneDetailSerializer(serializers.ModelSerializer):
     Unity_Scene = UnitySceneSerializer(source='unity_scene')
     product_categories = ProductCategoriesSerializer(source='tech_and_digital_services_tier_1', many=True)
@@ -1090,18 +1200,12 @@ class SceneDetailSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        settings = SiteConfig.objects.first()
+        settings = SiteConfig.get_instance()
         
-        unity_scene_version = data.get('unity_scene_version')
-
-        if unity_scene_version:
-            obj = UnitySceneVersion.objects.get(id=unity_scene_version)
-            serializer = UnitySceneVersionSerializer(obj)
+        if instance.unity_scene_version_id:
+            serializer = UnitySceneVersionSerializer(instance.unity_scene_version)
             data['unity_scene_version'] = serializer.data
         
-        if not settings:
-            settings = SiteConfig.objects.create()
-        
         if settings.immersive_experience:
             data.pop('scene_group')
 
@@ -1134,10 +1238,7 @@ class SceneCreateSerializer(serializers.ModelSerializer):
         ]
 
     def create(self, validated_data):
-        settings = SiteConfig.objects.first()
-    
-        if not settings:
-            settings = SiteConfig.objects.create()
+        settings = SiteConfig.get_instance()
 
         interactions = validated_data.pop('interactions',None)
         product_categories = validated_data.pop('product_categories',None)
@@ -1145,7 +1246,15 @@ class SceneCreateSerializer(serializers.ModelSerializer):
         scene_group = validated_data.pop('scene_group', None)
        
         with transaction.atomic():
-            scene = Scene.objects.create(**validated_data)
+            try:
+                with transaction.atomic():
+                    scene = Scene.objects.create(**validated_data)
+            except IntegrityError:
+                # lost a race with another scene taking the same unity scene
+                unity_scene = validated_data.get('unity_scene')
+                if unity_scene is not None and unity_scene_in_use(unity_scene):
+                    raise serializers.ValidationError({"unity_scene":[UNITY_SCENE_IN_USE]})
+                raise
 
             if scene_group:
                 if settings.immersive_experience:
@@ -1216,10 +1325,8 @@ class SceneCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("unity scene with this id was not found")
         
         if unityScene.deleted_at is None:
-            scene = Scene.objects.filter(deleted_at__isnull=True)
-            for i in scene:
-                if i.unity_scene == unityScene:
-                        raise serializers.ValidationError("unity_scene with this id is already associated with a scene")
+            if unity_scene_in_use(unityScene):
+                raise serializers.ValidationError(UNITY_SCENE_IN_USE)
             return unityScene
         else:
             raise serializers.ValidationError("cannot select a unity scene that is deleted")
@@ -1262,10 +1369,18 @@ class SceneUpdateSerializer(serializers.ModelSerializer):
         ]
 
     def update(self, instance, validated_data):
-        settings = SiteConfig.objects.first()
-        
-        if not settings:
-            settings = SiteConfig.objects.create()
+        # the m2m writes roll back with the scene when anything fails
+        try:
+            with transaction.atomic():
+                return self.update_scene(instance, validated_data)
+        except IntegrityError:
+            unity_scene = validated_data.get('unity_scene')
+            if unity_scene is not None and unity_scene_in_use(unity_scene, instance):
+                raise serializers.ValidationError({"unity_scene":[UNITY_SCENE_IN_USE]})
+            raise
+
+    def update_scene(self, instance, validated_data):
+        settings = SiteConfig.get_instance()
 
         scene = instance
         interactions = validated_data.pop('interactions', None)
@@ -1381,14 +1496,8 @@ class SceneUpdateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("unity scene with this id was not found")
         
         if unityScene.deleted_at is None:
-            scene = Scene.objects.filter(deleted_at__isnull=True)
-            itself = self.instance.id
-            for i in scene:
-                if i.unity_scene == unityScene:
-                        if itself == i.id:
-                            return unityScene
-                        else:
-                            raise serializers.ValidationError("unity_scene with this id is already associated with a scene")
+            if unity_scene_in_use(unityScene, self.instance):
+                raise serializers.ValidationError(UNITY_SCENE_IN_USE)
             return unityScene
         else:
             raise serializers.ValidationError("cannot select a unity scene that is deleted")
@@ -1780,3 +1889,40 @@ class SceneGroupSerializer(serializers.ModelSerializer):
         instance = super().create(validated_data)
         return instance
 
+
+
+#--------------------------------------------------------------------------------
+# SEARCH SERIALIZERS
+#--------------------------------------------------------------------------------
+class SceneSearchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Scene
+        fields = [
+            'id',
+            'title',
+            'slug',
+            'subtitle',
+            'image'
+        ]
+
+class SceneCategorySearchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Sector
+        fields = [
+            'id',
+            'name',
+            'slug',
+            'image'
+        ]
+
+class ProductSearchSerializer(serializers.ModelSerializer):
+    name = serializers.CharField(source='display_text')
+    product_category = serializers.PrimaryKeyRelatedField(source='service', read_only=True)
+    class Meta:
+        model = ProductPanel
+        fields = [
+            'id',
+            'name',
+            'slug',
+            'product_category'
+        ]
@@ -0,0 +1,76 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from .autocomplete import AUTOCOMPLETE_MODELS, index_instance, unindex_instance
+from .cache import invalidate
+from .counts import invalidate_counts
+from .documents import CONFIG_DOCUMENT_KEY, CONFIG_DOCUMENT_MODELS
+from .models import (AuditTrail, CallToActionPro, FilterIcon, HomePageOption, ProductPanel,
+                     ProductTier1, Scene, Sector, ShareIcon, SiteConfig, UnityScene)
+from .permissions import invalidate_user_roles
+
+SINGLETON_MODELS = (SiteConfig, HomePageOption, ShareIcon, FilterIcon)
+# models whose list endpoints report totals through dashboard.counts
+COUNTED_MODELS = (AuditTrail, Scene, Sector, ProductPanel, ProductTier1, UnityScene, CallToActionPro, User)
+
+
+def invalidate_singleton(sender, **kwargs):
+    invalidate(sender._meta.label_lower)
+
+
+def invalidate_site_config(sender, **kwargs):
+    # SiteConfig.default_scene is nulled with a queryset update (no signal)
+    invalidate(SiteConfig._meta.label_lower)
+
+
+def invalidate_config_document(sender, **kwargs):
+    invalidate(CONFIG_DOCUMENT_KEY)
+
+
+def counted_model_changed(sender, **kwargs):
+    invalidate_counts(sender)
+
+
+def autocomplete_saved(sender, instance, **kwargs):
+    index_instance(instance)
+
+
+def autocomplete_deleted(sender, instance, **kwargs):
+    unindex_instance(instance)
+
+
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # forward: user.groups.add(...), reverse: group.user_set.add(...)
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_user_roles(instance.pk)
+        return
+
+    if action == 'pre_clear':
+        instance._cleared_user_ids = list(instance.user_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        pk_set = getattr(instance, '_cleared_user_ids', [])
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        for user_id in pk_set:
+            invalidate_user_roles(user_id)
+
+
+for model in SINGLETON_MODELS:
+    post_save.connect(invalidate_singleton, sender=model, dispatch_uid='snapshot-save-{}'.format(model.__name__))
+    post_delete.connect(invalidate_singleton, sender=model, dispatch_uid='snapshot-delete-{}'.format(model.__name__))
+
+post_delete.connect(invalidate_site_config, sender=Scene, dispatch_uid='snapshot-delete-scene')
+
+for model in CONFIG_DOCUMENT_MODELS:
+    post_save.connect(invalidate_config_document, sender=model, dispatch_uid='config-document-save-{}'.format(model.__name__))
+    post_delete.connect(invalidate_config_document, sender=model, dispatch_uid='config-document-delete-{}'.format(model.__name__))
+
+for model in COUNTED_MODELS:
+    post_save.connect(counted_model_changed, sender=model, dispatch_uid='counts-save-{}'.format(model.__name__))
+    post_delete.connect(counted_model_changed, sender=model, dispatch_uid='counts-delete-{}'.format(model.__name__))
+
+for model in AUTOCOMPLETE_MODELS:
+    post_save.connect(autocomplete_saved, sender=model, dispatch_uid='autocomplete-save-{}'.format(model.__name__))
+    post_delete.connect(autocomplete_deleted, sender=model, dispatch_uid='autocomplete-delete-{}'.format(model.__name__))
+
+m2m_changed.connect(user_groups_changed, sender=User.groups.through, dispatch_uid='user-roles-groups')
@@ -1,3 +1,72 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .models import ProductPanel, ProductTier1, Scene, ServiceSubCategory
+
+
+# ---------------------------------------------------------------------------------------------------------
+# QUERY COUNTS
+# ---------------------------------------------------------------------------------------------------------
+# cache.clear() must not wipe the project's cache
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class QueryCountTests(TestCase):
+    '''
+    the number of queries of the listing and detail views does not grow with
+    the product categories they render
+    '''
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+        self.scene = Scene.objects.create(
+            title='Scene', slug='scene', image='scene/images/scene.png', description='scene')
+
+    def add_categories(self, count):
+        start = ProductTier1.objects.count()
+        for index in range(start, start + count):
+            category = ProductTier1.objects.create(name='Category {}'.format(index), position_x=0, position_y=0)
+            subcategory = ServiceSubCategory.objects.create(directus_id=index, name='Subcategory {}'.format(index))
+            for panel_index in range(2):
+                panel = ProductPanel.objects.create(
+                    service=category,
+                    display_text='Panel {}.{}'.format(index, panel_index),
+                    product_description='panel',
+                    position_x=0,
+                    position_y=0,
+                )
+                panel.subcategory.add(subcategory)
+            # a deleted panel is not rendered and must not cost a query either
+            ProductPanel.objects.create(
+                service=category, display_text='Deleted', product_description='panel', deleted_at=category.created_at)
+            self.scene.tech_and_digital_services_tier_1.add(category)
+
+    def count_queries(self, url):
+        # the first request also creates the singleton rows the views read
+        self.client.get(url)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assert_constant_queries(self, url, key):
+        self.add_categories(5)
+        expected = self.count_queries(url)
+        self.add_categories(15)
+        cache.clear()
+        with self.assertNumQueries(expected):
+            response = self.client.get(url)
+        self.assertEqual(len(key(response.data)), 20)
+
+    def test_product_categories_list(self):
+        self.assert_constant_queries(
+            reverse('product-categories-list') + '?limit=20', lambda data: data['data'])
+
+    def test_scene_detail(self):
+        self.assert_constant_queries(
+            reverse('scene-detail', args=[self.scene.pk]), lambda data: data['data']['product_categories'])
@@ -6,9 +6,12 @@ urlpatterns = [
     
     #AUDIT 
     path('audits', views.AuditListView.as_view(), name='audit-list'),
+    path('audits/export', views.AuditExportView.as_view(), name='audit-export'),
+    path('audits/history', views.AuditHistoryView.as_view(), name='audit-history'),
 
     #SEARCH
     path('search', views.SearchView.as_view(), name='search'),
+    path('search/autocomplete', views.AutocompleteView.as_view(), name='search-autocomplete'),
 
     #CONTACT US
     path('contactus', views.ContactUs.as_view(), name='contact-us'),
@@ -42,6 +45,8 @@ urlpatterns = [
     path('unity-scenes/create',views.UnitySceneCreateView.as_view(), name='unity-scenes-create'),
     path('unity-scenes/<int:pk>/update', views.UnitySceneUpdateView.as_view(), name='unity-scenes-update'),
     path('unity-scenes/<int:pk>/delete', views.UnitySceneDeleteView.as_view(), name='unity-scenes-delete'),
+    path('unity-scenes/<int:pk>/status', views.UnitySceneStatusView.as_view(), name='unity-scenes-status'),
+    path('unity-scenes/<int:pk>/rollback', views.UnitySceneRollbackView.as_view(), name='unity-scenes-rollback'),
 
     #UNITY SCENES VERSION
     path('unity-scenes/<int:pk>/versions', views.UnitySceneVersionListView.as_view(), name='unity-scene-version-list'),
@@ -1,5 +1,4 @@
 import json
-import zipfile
 
 from django.conf import settings
 from django.conf import settings as conf_settings
@@ -17,11 +16,6 @@ BASE_URL = settings.BASE_URL if hasattr(settings, 'BASE_URL') else ''
 
 User = get_user_model()
 
-def extract_unity_file(obj):
-	with zipfile.ZipFile(obj.unity_file, 'r') as zip_ref:
-	    zip_ref.extractall('media/unity/{}'.format(obj.name))
-
-
 def reset_user_password(user, extra={}):
 	'''
 	Generates new random password for the user and sends email.
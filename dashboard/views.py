@@ -1,5 +1,8 @@
 from django.contrib.auth.models import User
-from django.http import Http404, HttpResponseNotAllowed
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import etag
 from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated , IsAdminUser
 from rest_framework.response import Response
@@ -9,13 +12,25 @@ from rest_framework_simplejwt.views import TokenRefreshView
 from rest_framework_simplejwt.exceptions import TokenError
 from django.shortcuts import get_object_or_404
 from rest_framework.pagination import LimitOffsetPagination
-from django.db.models import Prefetch
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch, Subquery
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+import datetime
 import json
 from django.core.mail import send_mail
 from django.conf import settings
 
 
-from .audits import store_audit
+from .audit_archive import ArchivedMonth, is_archived, month_bounds, parse_month
+from .audit_export import EXPORT_FORMATS, AuditFilter, get_records
+from .audit_snapshots import AuditStates, snapshot
+from .audits import field_label, store_audit, store_audits
+from .autocomplete import AUTOCOMPLETE_LIMIT, AUTOCOMPLETE_MAX_LIMIT, get_autocomplete_index
+from .cache import invalidate
+from .counts import get_total
+from .documents import CONFIG_DOCUMENT_KEY, get_config_document
+from .extraction import ExtractionError, is_stale, resume_extraction, rollback_build
 from .models import (
     AuditTrail,
     CallToActionPro,
@@ -36,6 +51,7 @@ from .models import (
     SceneGroup,
     UnitySceneVersion
 )
+from .pagination import ArchivePagination, get_paginator
 from .permissions import (
     DeveloperPermission,
     ProductManagerPermission,
@@ -69,6 +85,7 @@ from .serializers import (
     FileLibraryUpdateSerializer,
     SceneDetailSerializer,
     ProductCategoriesDetailSerializer,
+    AuditHistorySerializer,
     AuditTrailSerializer,
     SceneDropdownSerializer,
     SceneCategoriesDropdownSerializer,
@@ -91,9 +108,12 @@ from .serializers import (
     UnitySceneVersionSerializer,
     UnitySceneVersionCreateSerializer,
     SceneCategorySerializer,
+    related_products_prefetch,
+    scene_detail_queryset,
 
 
 )
+from .search import SEARCH_LIMIT, SEARCH_MAX_LIMIT, SEARCH_TYPES, SearchError, decode_cursor, search
 from .utils import reset_user_password
 from rest_framework.exceptions import AuthenticationFailed
 
@@ -116,23 +136,153 @@ class AuditListView(CustomAPIView):
     def get(self, request):
         instance = AuditTrail.objects.order_by("-updated_at")
 
+        # ?month=YYYY-MM, read from its archive once retention has moved it out
+        month = request.query_params.get('month')
+        if month is not None:
+            try:
+                month = parse_month(month)
+            except ValueError:
+                return Response({"month":['month must be formatted YYYY-MM']}, status=status.HTTP_400_BAD_REQUEST)
+            if is_archived(month):
+                return self.get_archived(request, month)
+            start, end = month_bounds(month)
+            instance = instance.filter(created_at__gte=start, created_at__lt=end)
+
         #PAGINATION
-        paginator = LimitOffsetPagination()
-        paginator.default_limit = 10
+        paginator = get_paginator(request, ('-created_at', '-id'))
         paginated_data = paginator.paginate_queryset(instance, request)
 
         serializer = AuditTrailSerializer(paginated_data, many=True)
-        count = instance.count()
+        count = paginator.count
+        count_exact = paginator.count_exact
 
         response_data = {
                 'data': serializer.data,
                 'next': paginator.get_next_link(),
                 'previous': paginator.get_previous_link(),
-                'total':count
+                'total':count,
+                'total_exact': count_exact,
+                'archived': False
             }
         
         return Response(response_data)
 
+    def get_archived(self, request, month):
+        paginator = ArchivePagination()
+        paginated_data = paginator.paginate_queryset(ArchivedMonth(month), request)
+
+        serializer = AuditTrailSerializer(paginated_data, many=True)
+
+        response_data = {
+                'data': serializer.data,
+                'next': paginator.get_next_link(),
+                'previous': paginator.get_previous_link(),
+                'total': paginator.count,
+                'total_exact': paginator.count_exact,
+                'archived': True
+            }
+
+        return Response(response_data)
+
+
+class AuditExportView(CustomAPIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated,
+                          (SuperAdminPermission | UberAdminPermission | IsAdminUser)]
+
+    def parse_date(self, name):
+        '''
+        reads an ISO date or datetime query param, naive values are UTC
+        '''
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                parsed = parse_date(value)
+                parsed = parsed and datetime.datetime.combine(parsed, datetime.time())
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValueError(name)
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, datetime.timezone.utc)
+        return parsed
+
+    def get(self, request):
+        # not ?format=, rest framework keeps that one for content negotiation
+        export_format = request.query_params.get('type', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response({"type":['type must be one of {}'.format(', '.join(EXPORT_FORMATS))]}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            start = self.parse_date('from')
+            end = self.parse_date('to')
+        except ValueError as error:
+            return Response({str(error):['must be an ISO date or datetime']}, status=status.HTTP_400_BAD_REQUEST)
+        user_id = request.query_params.get('user')
+        if user_id is not None:
+            try:
+                user_id = int(user_id)
+            except ValueError:
+                return Response({"user":['user must be an integer']}, status=status.HTTP_400_BAD_REQUEST)
+
+        audit_filter = AuditFilter(
+            start=start,
+            end=end,
+            user_id=user_id,
+            model_type=request.query_params.get('model_type') or None,
+            action=request.query_params.get('action') or None,
+        )
+        stream, content_type, extension = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(stream(get_records(audit_filter)), content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="audits.{}"'.format(extension)
+        return response
+
+
+class AuditHistoryView(CustomAPIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated,
+                          (SuperAdminPermission | UberAdminPermission | IsAdminUser)]
+
+    def get(self, request):
+        model_type = request.query_params.get('model_type')
+        try:
+            object_id = int(request.query_params['object_id'])
+        except (KeyError, ValueError):
+            return Response({"object_id":['object_id must be an integer']}, status=status.HTTP_400_BAD_REQUEST)
+        if not model_type:
+            return Response({"model_type":['this field is required']}, status=status.HTTP_400_BAD_REQUEST)
+
+        # newest first, a range of audit_object_history_idx
+        instance = AuditTrail.objects.filter(
+            model_type=model_type, object_id=object_id).order_by('-id')
+
+        #PAGINATION
+        paginator = get_paginator(request, ('-id',))
+        paginated_data = paginator.paginate_queryset(instance, request)
+
+        # full states are rebuilt from the nearest keyframes on request
+        if request.query_params.get('state') in ('1', 'true'):
+            states = AuditStates(paginated_data)
+            for audit in paginated_data:
+                found = states.get(audit)
+                audit.state = found[0] if found is not None else None
+
+        serializer = AuditHistorySerializer(paginated_data, many=True)
+        count = paginator.count
+        count_exact = paginator.count_exact
+
+        response_data = {
+                'data': serializer.data,
+                'next': paginator.get_next_link(),
+                'previous': paginator.get_previous_link(),
+                'total':count,
+                'total_exact': count_exact
+            }
+
+        return Response(response_data)
+
 
 # ---------------------------------------------------------------------------------------------------------
 # SEARCH
@@ -140,10 +290,7 @@ class AuditListView(CustomAPIView):
 class SearchView(APIView):
         
     def dispatch(self, request, *args, **kwargs):
-        settings = SiteConfig.objects.first()
-        
-        if not settings:
-            settings = SiteConfig.objects.create()
+        settings = SiteConfig.get_instance()
 
         if settings.browse_without_login:
             self.authentication_classes = []
@@ -155,31 +302,52 @@ class SearchView(APIView):
         return super().dispatch(request, *args, **kwargs)
 
     def get(self, request):
+        key_query = request.query_params.get('key')
+        search_type = request.query_params.get('type')
+        cursor = request.query_params.get('cursor')
 
-        scene = Scene.objects.filter(deleted_at__isnull=True)
-        scene_category = Sector.objects.filter(deleted_at__isnull=True)
-        product = ProductPanel.objects.filter(deleted_at__isnull=True)
+        if not key_query:
+            raise Http404
 
-        key_query = request.query_params.get('key')
+        try:
+            limit = min(int(request.query_params.get('limit', SEARCH_LIMIT)), SEARCH_MAX_LIMIT)
+        except ValueError:
+            return Response({"limit":['limit must be an integer']}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({"limit":['limit must be positive']}, status=status.HTTP_400_BAD_REQUEST)
+
+        offset = 0
+        if cursor is not None:
+            try:
+                search_type, offset = decode_cursor(cursor)
+            except SearchError as e:
+                return Response({"cursor":[str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+
+        if search_type is not None and search_type not in SEARCH_TYPES:
+            return Response({"type":['type must be one of {}'.format(', '.join(SEARCH_TYPES))]}, status=status.HTTP_400_BAD_REQUEST)
+
+        types = [search_type] if search_type else None
+        response_data, next_cursors = search(key_query, types=types, limit=limit, offset=offset)
+
+        return Response({"data":response_data, "next":next_cursors})
+
+class AutocompleteView(SearchView):
+    '''
+    suggestions for the header search box, served from the in-process prefix index
+    '''
+
+    def get(self, request):
+        key_query = request.query_params.get('key', '')
 
         try:
-            scene_data = scene.filter(title__icontains=key_query)
-            category_data = scene_category.filter(name__icontains=key_query)
-            product_data = product.filter(display_text__icontains=key_query)
-            
-            scene_serilaizer = SceneDetailSerializer(scene_data, many=True)
-            category_serializer = SceneCategoriesSerializer(category_data, many=True)
-            product_serializer = ProductSerializer(product_data, many=True)
-            
-            response_data = {
-                "scene":scene_serilaizer.data,
-                "scene_category":category_serializer.data,
-                "product":product_serializer.data
-            }
-            return Response({"data":response_data})
-        
-        except:
-            raise Http404
+            limit = min(int(request.query_params.get('limit', AUTOCOMPLETE_LIMIT)), AUTOCOMPLETE_MAX_LIMIT)
+        except ValueError:
+            return Response({"limit":['limit must be an integer']}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({"limit":['limit must be at least 1']}, status=status.HTTP_400_BAD_REQUEST)
+
+        suggestions = get_autocomplete_index().suggest(key_query, limit)
+        return Response({"data":suggestions})
 
 # ---------------------------------------------------------------------------------------------------------
 # CONTACT US
@@ -230,10 +398,7 @@ class ContactUs(CustomAPIView):
 class UserView(CustomAPIView):
 
     def dispatch(self, request, *args, **kwargs):
-        settings = SiteConfig.objects.first()
-        
-        if not settings:
-            settings = SiteConfig.objects.create()
+        settings = SiteConfig.get_instance()
 
         if settings.browse_without_login:
             self.authentication_classes = [JWTAuthentication]
@@ -246,10 +411,7 @@ class UserView(CustomAPIView):
 
     def get(self, request):
 
-        settings = SiteConfig.objects.first()
-        if not settings:
-            settings = SiteConfig.objects.create()
-        
+        settings = SiteConfig.get_instance()
         browse_without_login = settings.browse_without_login
         title = settings.title
         user = request.user
@@ -283,18 +445,19 @@ class UserListView(CustomAPIView):
         user = User.objects.order_by("-date_joined").filter(is_superuser = False)
 
         #PAGINATION
-        paginator = LimitOffsetPagination()
-        paginator.default_limit = 10
+        paginator = get_paginator(request, ('-date_joined', '-id'))
         paginated_data = paginator.paginate_queryset(user, request)
 
         serializer = UserSerializer(paginated_data, many=True)
-        count = user.count()
+        count = paginator.count
+        count_exact = paginator.count_exact
 
         response_data = {
                 'data': serializer.data,
                 'next': paginator.get_next_link(),
                 'previous': paginator.get_previous_link(),
-                'total':count
+                'total':count,
+                'total_exact': count_exact
             }
 
         if first_name_query or last_name_query or role_query:
@@ -308,13 +471,15 @@ class UserListView(CustomAPIView):
             paginated_data = paginator.paginate_queryset(queryset, request)    
 
             serializer = UserSerializer(paginated_data, many=True)
-            count = queryset.count()
+            count = paginator.count
+            count_exact = paginator.count_exact
 
             response_data = {
                     'data': serializer.data,
                     'next': paginator.get_next_link(),
                     'previous': paginator.get_previous_link(),
-                    'total': count
+                    'total': count,
+                    'total_exact': count_exact
                 }
 
             return Response(response_data)
@@ -420,18 +585,17 @@ class SceneListView(CustomAPIView):
 
         scene = Scene.objects.filter(
             deleted_at__isnull=True).order_by("priority","-created_at")
-        
-        count = scene.count()
 
         #PAGINATION
-        paginator = LimitOffsetPagination()
-        paginator.default_limit = 10
+        paginator = get_paginator(request, ('priority', '-created_at', '-id'))
         paginated_data = paginator.paginate_queryset(scene, request)
+        count = paginator.count
+        count_exact = paginator.count_exact
 
-        settings = SiteConfig.objects.first()
+        settings = SiteConfig.get_instance()
         if settings.immersive_experience:
 
-            if not settings.default_scene:
+            if not settings.default_scene_id:
                 settings.default_scene = Scene.objects.first()
                 settings.save()
 
@@ -443,7 +607,8 @@ class SceneListView(CustomAPIView):
             'data': serializer.data,
             'next': paginator.get_next_link(),
             'previous': paginator.get_previous_link(),
-            'total': count
+            'total': count,
+            'total_exact': count_exact
             }
 
         if scene_category_id is not None:
@@ -456,13 +621,14 @@ class SceneListView(CustomAPIView):
             if scene_category: 
                 scene = Scene.objects.filter(sectors_and_departments=scene_category)
                 serializer = SceneSerializer(scene, many=True)
-                count = scene.count()
+                count, count_exact = get_total(scene)
                 
             response_data = {
             'data': serializer.data,
             'next': paginator.get_next_link(),
             'previous': paginator.get_previous_link(),
-            'total':count
+            'total':count,
+            'total_exact': count_exact
             }
 
             return Response(response_data)
@@ -482,13 +648,15 @@ class SceneListView(CustomAPIView):
             paginated_data = paginator.paginate_queryset(queryset, request)
 
             serializer = SceneSerializer(paginated_data, many=True)
-            count = queryset.count()
+            count = paginator.count
+            count_exact = paginator.count_exact
 
             response_data = {
                 'data': serializer.data,
                 'next': paginator.get_next_link(),
                 'previous': paginator.get_previous_link(),
-                'total': count
+                'total': count,
+                'total_exact': count_exact
                 }
 
             return Response(response_data)
@@ -500,12 +668,12 @@ class SceneDetailView(CustomAPIView):
     
     def get_object(self, pk):
         try:
-            return Scene.objects.get(id=pk)
+            return scene_detail_queryset().get(id=pk)
         except Scene.DoesNotExist:
             raise Http404
     
     def dispatch(self, request, *args, **kwargs):
-        settings = SiteConfig.objects.first()
+        settings = SiteConfig.get_instance()
         if settings.browse_without_login:
             self.authentication_classes = []
             self.permission_classes = []
@@ -529,7 +697,7 @@ class SceneSlugDetails(CustomAPIView):
     
     def get_slug(self, slug):
         try:
-            return Scene.objects.get(slug=slug)
+            return scene_detail_queryset().get(slug=slug)
         except Scene.DoesNotExist:
             raise Http404
     
@@ -575,16 +743,10 @@ class SceneUpdateView(generics.UpdateAPIView, CustomAPIView):
         serializer = SceneUpdateSerializer(instance, data=request.data, partial=True)
         if serializer.is_valid():
             data = serializer.save()
-            try:
-                prev_obj = AuditTrail.objects.filter(
-                    object_id=instance.id).order_by('-created_at')[0]
-            except:
-                prev_obj = None
             store_audit(
                 request=self.request,
                 instance=data,
-                action="UPDATE",
-                previous_instance=prev_obj
+                action="UPDATE"
             )
             return Response({"message" : "scene successfully updated"}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -605,12 +767,9 @@ class SceneDeleteView(generics.DestroyAPIView, CustomAPIView):
     def destroy(self, request, pk, *args, **kwargs):
         instance = self.get_object(pk)
         
-        settings = SiteConfig.objects.first()
-
-        if not settings:
-            settings = SiteConfig.objects.first()
+        settings = SiteConfig.get_instance()
 
-        if settings.default_scene == instance:
+        if settings.default_scene_id == instance.id:
             return Response({"error":"unable to delete this scene as it is default scene for immersive experience"}, status=status.HTTP_400_BAD_REQUEST)
 
         if instance.deleted_at is not None:
@@ -621,9 +780,7 @@ class SceneDeleteView(generics.DestroyAPIView, CustomAPIView):
         store_audit(
             request=self.request,
             instance=self.get_object(pk),
-            action="DELETE",
-            previous_instance=AuditTrail.objects.filter(
-                object_id=pk).order_by('-created_at')[0]
+            action="DELETE"
         )
         return Response({"message": "scene deleted successfully"}, status=status.HTTP_200_OK)
 
@@ -638,10 +795,7 @@ class SceneCategoriesListView(CustomAPIView):
                           (SuperAdminPermission | UberAdminPermission | IsAdminUser)]
     
     def dispatch(self, request, *args, **kwargs):
-        settings = SiteConfig.objects.first()
-        
-        if not settings:
-            settings = SiteConfig.objects.create()
+        settings = SiteConfig.get_instance()
 
         if settings.browse_without_login:
             self.authentication_classes = []
@@ -662,18 +816,19 @@ class SceneCategoriesListView(CustomAPIView):
             deleted_at__isnull=True).order_by("-created_at")
 
         #PAGINATION
-        paginator = LimitOffsetPagination()
-        paginator.default_limit = 10
+        paginator = get_paginator(request, ('-created_at', '-id'))
         paginated_data = paginator.paginate_queryset(data, request)
 
         serializer = SceneCategoriesSerializer(paginated_data, many=True)
-        count = data.count()
+        count = paginator.count
+        count_exact = paginator.count_exact
 
         response_data = {
             'data': serializer.data,
             'next': paginator.get_next_link(),
             'previous': paginator.get_previous_link(),
-            'total': count
+            'total': count,
+            'total_exact': count_exact
             }
         
         if dropdown is not None:
@@ -691,13 +846,15 @@ class SceneCategoriesListView(CustomAPIView):
             paginated_data = paginator.paginate_queryset(queryset, request)
 
             serializer = SceneCategoriesSerializer(paginated_data, many=True)
-            count = queryset.count()
+            count = paginator.count
+            count_exact = paginator.count_exact
 
             response_data = {
                     'data': serializer.data,
                     'next': paginator.get_next_link(),
                     'previous': paginator.get_previous_link(),
-                    'total': count
+                    'total': count,
+                    'total_exact': count_exact
                 }
 
             return Response(response_data, status=status.HTTP_200_OK)
@@ -712,10 +869,7 @@ class SceneCategoriesDetailView(CustomAPIView):
                           (SuperAdminPermission | UberAdminPermission | IsAdminUser)]
     
     def dispatch(self, request, *args, **kwargs):
-        settings = SiteConfig.objects.first()
-        
-        if not settings:
-            settings = SiteConfig.objects.create()
+        settings = SiteConfig.get_instance()
 
         if settings.browse_without_login:
             self.authentication_classes = []
@@ -928,59 +1082,18 @@ class UnitySceneListView(CustomAPIView):
 
         unity_scene = UnityScene.objects.filter(
             deleted_at__isnull=True).order_by("-created_at")
+        scenes_using = Scene.objects.filter(
+            deleted_at__isnull=True, unity_scene=OuterRef('pk')).order_by('-id')
 
         #PAGINATION
-        paginator = LimitOffsetPagination()
-        paginator.default_limit = 10
-        paginated_data = paginator.paginate_queryset(unity_scene, request)
-
-        serializer = UnitySceneSerializer(paginated_data, many=True)
-        count = unity_scene.count()
-
-        data = []
-
-        for unitySceneItem in serializer.data:
-            id = unitySceneItem['id']
-            try:
-                obj = Scene.objects.get(unity_scene=id)
-            except Scene.DoesNotExist:
-                obj = None
-                
-            if obj:
-                related_scene = {
-                    "id":obj.id,
-                    "name":obj.title
-                }
-            else:
-                related_scene = None
-
-            unitySceneObj = {
-                "id":unitySceneItem['id'],
-                "name":unitySceneItem['name'],
-                "background_image":unitySceneItem['background_image'],
-                "loading_text":unitySceneItem['loading_text'],
-                "unity_file":unitySceneItem['unity_file'],
-                "related_scene":related_scene
-                }
-
-            data.append(unitySceneObj)
-
-        response_data = {
-            'data': data,
-            'next': paginator.get_next_link(),
-            'previous': paginator.get_previous_link(),
-            'total': count 
-            }
-        
-        used_unity_scenes = []
-        free_unity_scenes = []
+        paginator = get_paginator(request, ('-created_at', '-id'))
 
         if dropdown is not None:
-            scene = Scene.objects.filter(deleted_at__isnull=True)
+            free_unity_scenes = []
 
             if scene_id is not None:
                 try:
-                    obj = Scene.objects.get(id = scene_id)
+                    obj = Scene.objects.select_related('unity_scene').get(id = scene_id)
                 except Scene.DoesNotExist:
                     obj = None
                 if obj:
@@ -988,21 +1101,16 @@ class UnitySceneListView(CustomAPIView):
                         serializer = UnitySceneDropdownSerializer(obj.unity_scene)
                         free_unity_scenes.append(serializer.data)
 
-            for i in scene:
-                for j in unity_scene:
-                    if i.unity_scene == j:
-                        used_unity_scenes.append(j.id)
-
-            for i in unity_scene:
-                if i.id not in used_unity_scenes:
-                    serializer = UnitySceneDropdownSerializer(i)
-                    free_unity_scenes.append(serializer.data)
+            # unity scenes no live scene points to
+            free = unity_scene.exclude(Exists(scenes_using))
+            serializer = UnitySceneDropdownSerializer(free, many=True)
+            free_unity_scenes.extend(serializer.data)
 
             return Response({"data":free_unity_scenes})
         
         elif scene_id is not None:
                 try:
-                    obj = Scene.objects.get(id = scene_id)
+                    obj = Scene.objects.select_related('unity_scene').get(id = scene_id)
                 except Scene.DoesNotExist:
                     obj = None
                 if obj:
@@ -1019,17 +1127,51 @@ class UnitySceneListView(CustomAPIView):
             paginated_data = paginator.paginate_queryset(queryset, request)
 
             serializer = UnitySceneSerializer(paginated_data, many=True)
-            count = queryset.count()
+            count = paginator.count
+            count_exact = paginator.count_exact
 
             response_data = {
             'data': serializer.data,
             'next': paginator.get_next_link(),
             'previous': paginator.get_previous_link(),
-            'total': count
+            'total': count,
+            'total_exact': count_exact
             }
 
             return Response(response_data)
 
+        paginated_data = paginator.paginate_queryset(
+            unity_scene.annotate(
+                related_scene_id=Subquery(scenes_using.values('id')[:1]),
+                related_scene_title=Subquery(scenes_using.values('title')[:1]),
+            ),
+            request,
+        )
+        count = paginator.count
+        count_exact = paginator.count_exact
+        serializer = UnitySceneSerializer(paginated_data, many=True)
+
+        data = []
+        for obj, unitySceneItem in zip(paginated_data, serializer.data):
+            if obj.related_scene_id:
+                related_scene = {
+                    "id":obj.related_scene_id,
+                    "name":obj.related_scene_title
+                }
+            else:
+                related_scene = None
+
+            unitySceneItem['related_scene'] = related_scene
+            data.append(unitySceneItem)
+
+        response_data = {
+            'data': data,
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+            'total': count,
+            'total_exact': count_exact
+            }
+
         return Response(response_data)
 
 
@@ -1067,6 +1209,55 @@ class UnitySceneUpdateView(generics.UpdateAPIView, CustomAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class UnitySceneStatusView(CustomAPIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated,
+                          (SuperAdminPermission | UberAdminPermission | IsAdminUser | ExperienceDesignerPermission | DeveloperPermission)]
+
+    def get(self, request, pk):
+        job = UnityScene.objects.filter(id=pk).values(
+            'id', 'extraction_status', 'extraction_progress', 'extraction_bytes',
+            'extraction_total_bytes', 'extraction_error', 'extraction_started_at',
+            'extraction_updated_at',
+        ).first()
+        if job is None:
+            raise Http404
+        if job['extraction_status'] == UnityScene.EXTRACTION_PENDING or (
+                job['extraction_status'] == UnityScene.EXTRACTION_EXTRACTING
+                and is_stale(job['extraction_updated_at'])):
+            # picks the job up again if its worker died
+            resume_extraction(pk)
+        seconds = None
+        if job['extraction_started_at'] and job['extraction_updated_at']:
+            seconds = round((job['extraction_updated_at'] - job['extraction_started_at']).total_seconds(), 3)
+        return Response({'data': {
+            'id': job['id'],
+            'status': job['extraction_status'],
+            'progress': job['extraction_progress'],
+            'bytes': job['extraction_bytes'],
+            'total_bytes': job['extraction_total_bytes'],
+            'error': job['extraction_error'] or None,
+            'seconds': seconds,
+            # uncompressed bytes written per second
+            'throughput': int(job['extraction_bytes'] / seconds) if seconds else None,
+        }})
+
+
+class UnitySceneRollbackView(CustomAPIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated,
+                          (SuperAdminPermission | UberAdminPermission | IsAdminUser | DeveloperPermission )]
+
+    def post(self, request, pk):
+        instance = get_object_or_404(UnityScene, id=pk)
+        try:
+            instance = rollback_build(instance)
+        except ExtractionError as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = UnitySceneSerializer(instance)
+        return Response({"message": "success", "data": serializer.data}, status=status.HTTP_200_OK)
+
+
 class UnitySceneDeleteView(generics.DestroyAPIView, CustomAPIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated,
@@ -1081,14 +1272,10 @@ class UnitySceneDeleteView(generics.DestroyAPIView, CustomAPIView):
     def destroy(self, request, pk, *args, **kwargs):
         instance = self.get_object(pk)
 
-        settings = SiteConfig.objects.first()
-
-        if not settings:
-            settings = SiteConfig.objects.create()
+        settings = SiteConfig.get_instance()
 
-        if settings.default_scene:
-            scene_id = settings.default_scene.id
-            scene = Scene.objects.get(id=scene_id)
+        if settings.default_scene_id:
+            scene = Scene.objects.get(id=settings.default_scene_id)
             unity_scene = scene.unity_scene
             if unity_scene == instance:
                 return Response({"error":"cannot delete this unity scene as it is associated with a scene that is selected for immersive experience"}, status=status.HTTP_400_BAD_REQUEST)
@@ -1191,18 +1378,19 @@ class ProductListView(CustomAPIView):
             deleted_at__isnull=True).order_by("-created_at")
         
         #PAGINATION
-        paginator = LimitOffsetPagination()
-        paginator.default_limit = 10
+        paginator = get_paginator(request, ('-created_at', '-id'))
         paginated_data = paginator.paginate_queryset(product, request)
 
         serializer = ProductSerializer(paginated_data, many=True)
-        count = product.count()
+        count = paginator.count
+        count_exact = paginator.count_exact
 
         response_data = {
             'data': serializer.data,
             'next': paginator.get_next_link(),
             'previous': paginator.get_previous_link(),
-            'total': count
+            'total': count,
+            'total_exact': count_exact
             }
 
         if dropdown is not None:
@@ -1221,13 +1409,15 @@ class ProductListView(CustomAPIView):
             paginated_data = paginator.paginate_queryset(queryset, request)
             
             serializer = ProductSerializer(paginated_data, many=True)
-            count = queryset.count()
+            count = paginator.count
+            count_exact = paginator.count_exact
 
             response_data = {
             'data': serializer.data,
             'next': paginator.get_next_link(),
             'previous': paginator.get_previous_link(),
-            'total': count
+            'total': count,
+            'total_exact': count_exact
             }
             return Response(response_data)
         
@@ -1319,21 +1509,22 @@ class ProductCategoriesListView(CustomAPIView):
         dropdown = request.query_params.get('dropdown')
         
         product = ProductTier1.objects.filter(
-            deleted_at__isnull=True).order_by("-created_at")
+            deleted_at__isnull=True).order_by("-created_at").prefetch_related(related_products_prefetch())
         
         #PAGINATION
-        paginator = LimitOffsetPagination()
-        paginator.default_limit = 10
+        paginator = get_paginator(request, ('-created_at', '-id'))
         paginated_data = paginator.paginate_queryset(product, request)
 
         serializer = ProductCategoriesSerializer(paginated_data, many=True)
-        count = product.count()
+        count = paginator.count
+        count_exact = paginator.count_exact
 
         response_data = {
             'data': serializer.data,
             'next': paginator.get_next_link(),
             'previous': paginator.get_previous_link(),
-            'total': count
+            'total': count,
+            'total_exact': count_exact
             }
         
         if dropdown is not None:
@@ -1349,13 +1540,15 @@ class ProductCategoriesListView(CustomAPIView):
             paginated_data = paginator.paginate_queryset(queryset, request)
 
             serializer = ProductCategoriesSerializer(paginated_data, many=True)
-            count = queryset.count()
+            count = paginator.count
+            count_exact = paginator.count_exact
 
             response_data = {
                 'data': serializer.data,
                 'next': paginator.get_next_link(),
                 'previous': paginator.get_previous_link(),
-                'total': count
+                'total': count,
+                'total_exact': count_exact
                 }
 
             return Response(response_data)
@@ -1468,18 +1661,19 @@ class InteractionsListView(CustomAPIView):
         
 
         #PAGINATION
-        paginator = LimitOffsetPagination()
-        paginator.default_limit = 10
+        paginator = get_paginator(request, ('-created_at', '-id'))
         paginated_data = paginator.paginate_queryset(queryset, request)
 
         serializer = InteractionsSerializer(paginated_data, many=True)
-        count = queryset.count()
+        count = paginator.count
+        count_exact = paginator.count_exact
 
         response_data = {
             'data': serializer.data,
             'next': paginator.get_next_link(),
             'previous': paginator.get_previous_link(),
-            'total': count
+            'total': count,
+            'total_exact': count_exact
             }
 
         if dropdown is not None:
@@ -1496,13 +1690,15 @@ class InteractionsListView(CustomAPIView):
             paginated_data = paginator.paginate_queryset(queryset, request)
 
             serializer = InteractionsSerializer(paginated_data, many=True)
-            count = queryset.count()
+            count = paginator.count
+            count_exact = paginator.count_exact
 
             response_data = {
                     'data': serializer.data,
                     'next': paginator.get_next_link(),
                     'previous': paginator.get_previous_link(),
-                    'total': count
+                    'total': count,
+                    'total_exact': count_exact
                 }
             return Response(response_data)
 
@@ -1583,6 +1779,14 @@ class InteractionsDeleteView(generics.DestroyAPIView, CustomAPIView):
 # SETTINGS
 # ---------------------------------------------------------------------------------------------------------
 
+# names the settings page clears fields by, and the SiteConfig fields they stand for
+SETTINGS_FIELD_ALIASES = {
+    'interactions': 'cta',
+    'categories': 'sector',
+    'product_categories': 'product_tier_1',
+    'product': 'product_entities_tier_3',
+}
+
 
 class SettingsView(CustomAPIView):
 
@@ -1592,10 +1796,7 @@ class SettingsView(CustomAPIView):
     
     def get_permissions(self):
         if self.request.method == 'GET':
-            settings = SiteConfig.objects.first()
-            
-            if not settings:
-                settings = SiteConfig.objects.create()
+            settings = SiteConfig.get_instance()
 
             if settings.browse_without_login:
                 self.authentication_classes = []
@@ -1608,30 +1809,27 @@ class SettingsView(CustomAPIView):
         return super().get_permissions()
 
     def get(self, request):
-        instance = SiteConfig.objects.first()
+        instance = SiteConfig.get_instance()
         serializer = SettingsSerializer(instance)
         return Response({"data": (serializer.data)})
 
     def post(self, request):
         instance = SiteConfig.objects.first()
+        # on a fresh install there is no row yet, the serializer creates it
+        before = {} if instance is None else snapshot(instance)
         serializer = SettingsUpdateSerializer(
             instance, data=request.data, partial=True) 
 
         if serializer.is_valid():
             data = serializer.save()
-            try:
-                prev_obj = AuditTrail.objects.filter(
-                    object_id=instance.id).order_by('-created_at')[0]
-            except:
-                prev_obj = None
-            for each_obj in range(len(list(serializer.initial_data.keys()))):
-                store_audit(
-                settings_object=(list(serializer.initial_data.keys())[each_obj]).replace('_',' ').upper(),
+            # one audit for the whole request, expanded per field by AuditListView
+            store_audit(
                 request=self.request,
                 instance=data,
-                action="UPDATE",
-                previous_instance=prev_obj
-                )
+                action="CREATE" if instance is None else "UPDATE",
+                fields={name: field_label(name) for name in serializer.initial_data},
+                before=before
+            )
             return Response({
                 "message": "successfully updated",
             })
@@ -1640,6 +1838,10 @@ class SettingsView(CustomAPIView):
 
     def delete(self, request):
         instance = SiteConfig.objects.first()
+        created = instance is None
+        if created:
+            # saved below, once the fields are known to be valid
+            instance = SiteConfig()
         try:
             fields_to_clear = request.data.get('data')
         except AttributeError:
@@ -1649,30 +1851,23 @@ class SettingsView(CustomAPIView):
             pass
         else:
             return Response({"error": "incorrect data format"}, status=status.HTTP_400_BAD_REQUEST)
+        before = {} if created else snapshot(instance)
         for field in fields_to_clear:
-            if field == 'interactions':
-                setattr(instance, 'cta','')
-            elif field == 'categories':
-                setattr(instance, 'sector', '')
-            elif field == 'product_categories':
-                setattr(instance,'product_tier_1','')
-            elif field == 'product':
-                setattr(instance,'product_entities_tier_3','')
+            if field in SETTINGS_FIELD_ALIASES:
+                setattr(instance, SETTINGS_FIELD_ALIASES[field], '')
             elif hasattr(instance, field):
                 setattr(instance, field, '')
             else:
                 return Response({'error': f'{field} is not a valid field'}, status=status.HTTP_400_BAD_REQUEST)
         
         instance.save()
-        for each_obj in range(len(fields_to_clear)):
-            store_audit(
-                settings_object=(fields_to_clear[each_obj].replace('_',' ')).upper(),
-                request=self.request,
-                instance=instance,
-                action="DELETE",
-                previous_instance=AuditTrail.objects.filter(
-                        object_id=instance.id).order_by('-created_at')[0]
-            )
+        store_audit(
+            request=self.request,
+            instance=instance,
+            action="CREATE" if created else "DELETE",
+            fields={SETTINGS_FIELD_ALIASES.get(field, field): field_label(field) for field in fields_to_clear},
+            before=before
+        )
 
         return Response({'message': f'{fields_to_clear} cleared'}, status=status.HTTP_200_OK)
 
@@ -1684,7 +1879,7 @@ class HomePageSettingsView(CustomAPIView):
                           (UberAdminPermission | IsAdminUser)]
 
     def get(self, request):
-        instance = HomePageOption.objects.first()
+        instance = HomePageOption.get_instance()
         serializer = HomePageSerializer(instance)
         if (serializer.data['option']=='SCENE'):
             scene = Scene.objects.filter(deleted_at__isnull = True)
@@ -1716,18 +1911,11 @@ class HomePageSettingsView(CustomAPIView):
             instance, data=request.data, partial=True)
         if serializer.is_valid():
             data = serializer.save()
-            try:
-                prev_obj = AuditTrail.objects.filter(
-                    object_id=instance.id).order_by('-created_at')[0]
-            except:
-                prev_obj = None
-
             store_audit(
             settings_object=(list(serializer.initial_data.keys())[0]).replace('_',' ').upper(),
             request=self.request,
             instance=data,
-            action="UPDATE",
-            previous_instance=prev_obj
+            action="UPDATE"
             )
 
             return Response({
@@ -1751,45 +1939,34 @@ class ThemeSettingView(CustomAPIView):
 
     def post(self, request):
         data = request.data.get('data', {})
-        for key, value in data.items():
-            if not value:
-                try:
-                    instance = ThemeOption.objects.get(key=key)
-                    instance.delete()
-
-                    try:
-                        prev_obj = AuditTrail.objects.filter(model_type='Theme Option',
-                        object_id=instance.id).order_by('-created_at')[0]
-                    except:
-                        prev_obj = None
-
-                    store_audit(
-                    request=self.request,
-                    instance=instance,
-                    action="DELETE",
-                    previous_instance=prev_obj
-                    )
-
-                except ThemeOption.DoesNotExist:
-                    pass
-            else:
-                obj, created = ThemeOption.objects.get_or_create(key=key)
-                obj.deleted_at = None
-                obj.value = value
-                obj.save()
-
-                try:
-                    prev_obj = AuditTrail.objects.filter(model_type = 'Theme Option',
-                        object_id=obj.id).order_by('-created_at')[0]
-                except:
-                    prev_obj = None
+        now = timezone.now()
+        empty_keys = [key for key, value in data.items() if not value]
+
+        with transaction.atomic():
+            deleted = list(ThemeOption.objects.filter(
+                key__in=empty_keys, deleted_at__isnull=True))
+            ThemeOption.objects.filter(
+                id__in=[obj.id for obj in deleted]).update(deleted_at=now, updated_at=now)
+            for obj in deleted:
+                obj.deleted_at = now
+
+            values = {key: value for key, value in data.items() if value}
+            ThemeOption.objects.bulk_create(
+                [ThemeOption(key=key, value=value) for key, value in values.items()],
+                update_conflicts=True,
+                unique_fields=['key'],
+                update_fields=['value', 'deleted_at', 'updated_at'],
+            )
+            # audited as stored: the objects passed in carry a new created_at
+            # (and no id on some backends) for the keys that already existed
+            updated = list(ThemeOption.objects.filter(key__in=values))
 
-                store_audit(
+            store_audits(
                 request=self.request,
-                instance=obj,
-                action="UPDATE",
-                previous_instance=prev_obj
-                )
+                entries=[(obj, "DELETE") for obj in deleted] + [(obj, "UPDATE") for obj in updated]
+            )
+            # bulk writes send no model signals
+            invalidate(CONFIG_DOCUMENT_KEY)
 
         return Response({"message": f"Successfully created / updated the values for the key",
                          "data": data})
@@ -1802,7 +1979,7 @@ class FilterIconView(CustomAPIView):
                           (SuperAdminPermission | UberAdminPermission | IsAdminUser)]
 
     def get(self, request):
-        instance = FilterIcon.objects.first()
+        instance = FilterIcon.get_instance()
         serializer = FilterIconSerializer(instance)
         return Response({"data":serializer.data})
 
@@ -1810,23 +1987,18 @@ class FilterIconView(CustomAPIView):
         instance = FilterIcon.objects.first()
         if not instance:
             instance = FilterIcon.objects.create()
+        before = snapshot(instance)
         serializer = FilterIconUpdateSerializer(
             instance, data=request.data, partial=True)
         if serializer.is_valid():
             data = serializer.save()
-            try:
-                prev_obj = AuditTrail.objects.filter(model_type = 'Filter Icon',
-                    object_id=instance.id).order_by('-created_at')[0]
-            except:
-                prev_obj = None
-            for each_obj in range(len(list(serializer.initial_data.keys()))):
-                store_audit(
-                settings_object=(list(serializer.initial_data.keys())[each_obj]).replace('_',' ').upper(),
+            store_audit(
                 request=self.request,
                 instance=data,
                 action="UPDATE",
-                previous_instance=prev_obj
-                )
+                fields={name: field_label(name) for name in serializer.initial_data},
+                before=before
+            )
             return Response({"message": "successfully updated"}, status=status.HTTP_200_OK)
         return Response({"error": (serializer.errors)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -1852,18 +2024,11 @@ class FilterActionView(CustomAPIView):
             else:
                 obj.show_in_filter = True
             obj.save()
-            try:
-                prev_obj = AuditTrail.objects.filter(model_type='Action Type',
-                object_id=obj.id).order_by('-created_at')[0]
-            except:
-                prev_obj = None
-
             store_audit(
                 settings_object=obj.text,
                 request=self.request,
                 instance=obj,
-                action="UPDATE",
-                previous_instance=prev_obj
+                action="UPDATE"
                 )
 
         return Response({"message":"success"}, status=status.HTTP_200_OK)
@@ -1877,10 +2042,7 @@ class ShareIconView(CustomAPIView):
     
     def get_permissions(self):
         if self.request.method == 'GET':
-            settings = SiteConfig.objects.first()
-            
-            if not settings:
-                settings = SiteConfig.objects.create()
+            settings = SiteConfig.get_instance()
 
             if settings.browse_without_login:
                 self.authentication_classes = []
@@ -1893,7 +2055,7 @@ class ShareIconView(CustomAPIView):
         return super().get_permissions()
 
     def get(self, request):
-        instance = ShareIcon.objects.first()
+        instance = ShareIcon.get_instance()
         serializer = ShareIconSerializer(instance)
         response_data = {
             "data":[
@@ -1941,12 +2103,6 @@ class ShareIconView(CustomAPIView):
             if i not in [1, 2, 3, 4, 5, 6]:
                 return Response({"error": "valid id not supplied"})
             
-        try:
-            prev_obj = AuditTrail.objects.filter(model_type = 'Share Icon',
-                object_id=instance.id).order_by('-created_at')[0]
-        except:
-            prev_obj = None
-            
         for i in id:
             if i == 1:
                 instance.show_facebook = not instance.show_facebook
@@ -1972,8 +2128,7 @@ class ShareIconView(CustomAPIView):
             settings_object=title,
             request=self.request,
             instance=instance,
-            action="UPDATE",
-            previous_instance=prev_obj
+            action="UPDATE"
             )
             
         return Response({"message": "success"}, status=status.HTTP_200_OK)
@@ -2027,17 +2182,10 @@ class SceneGroupUpdateView(CustomAPIView):
             instance, data=data, partial=True)
         if serializer.is_valid():
             data = serializer.save()
-            try:
-                prev_obj = AuditTrail.objects.filter(model_type = 'Scene Group',
-                    object_id=instance.id).order_by('-created_at')[0]
-            except:
-                prev_obj = None
-
             store_audit(
                 request=self.request,
                 instance=data,
-                action="UPDATE",
-                previous_instance=prev_obj
+                action="UPDATE"
                 )
             
             return Response({"message": "success", "data": (serializer.data)}, status=status.HTTP_200_OK)
@@ -2058,17 +2206,10 @@ class SceneGroupDeleteView(generics.DestroyAPIView, CustomAPIView):
     def destroy(self, request, pk, *args, **kwargs):
         instance = self.get_object(pk)
         self.perform_destroy(instance)
-        try:
-            prev_obj = AuditTrail.objects.filter(model_type = 'Scene Group',
-                object_id=instance.id).order_by('-created_at')[0]
-        except:
-            prev_obj = None
-
         store_audit(
             request=self.request,
             instance=instance,
-            action="DELETE",
-            previous_instance=prev_obj
+            action="DELETE"
             )
         return Response({"message": "Scene Group deleted successfully"}, status=status.HTTP_200_OK)
     
@@ -2089,116 +2230,12 @@ class ConfigView(CustomAPIView):
     #                                     (SuperAdminPermission | UberAdminPermission)]
     #     return super().dispatch(request, *args, **kwargs)
     
+    @method_decorator(etag(lambda request: get_config_document().etag))
     def get(self, request):
-        instance = HomePageOption.objects.first()
-        settings = SiteConfig.objects.first()
-
-        if not instance:
-            instance = HomePageOption.objects.create()
-
-        if not settings:
-            settings = SiteConfig.objects.create()
-        
-        isImmersive = settings.immersive_experience
-        title = None if settings.title == '' else settings.title    
-        favicon = None if settings.favicon == '' else settings.favicon.url
-        browse_without_login = settings.browse_without_login
-
-        theme_obj = ThemeOption.objects.filter(deleted_at__isnull=True).order_by()
-        theme_settings = {obj.key: obj.value for obj in theme_obj}
-
-        if instance.option == 'IMAGE':
-            if instance.image:
-                data = {
-                    "type": "IMAGE",
-                    "image":instance.image.url
-                }
-            else:
-                data = {
-                    "type":"IMAGE",
-                    "image":None
-                }
-
-        elif instance.option == 'VIDEO':
-            if instance.video_embed_code:
-                data = {
-                    "type":"VIDEO",
-                    "video_embed_code":instance.video_embed_code
-                }
-            else:
-                data = {
-                    "type":"VIDEO",
-                    "video_embed_code":"null"
-                }
-        else:
-            serializer = UnitySceneSerializer(instance.scene)
-            
-            try:
-                associated_scene = Scene.objects.get(unity_scene = instance.scene)
-            except Scene.DoesNotExist:
-                associated_scene = None
-            
-            data = { 
-                "type":"SCENE",
-                'unity_scene_id':serializer.data['id'],
-                'name':serializer.data['name'],
-                'background_image':serializer.data['background_image'],
-                'loading_text':serializer.data['loading_text'],
-            }
-            
-            if associated_scene:
-                associated_scene_data = SceneSerializer(associated_scene)
-                data['associated_scene'] = {
-                    'id' : associated_scene_data.data['id'],
-                    'title' : associated_scene_data.data['title'],
-                    'slug': associated_scene_data.data['slug'],
-                    'image': associated_scene_data.data['image']
-                }
-
-            
-        if isImmersive:
-            immersive_experience = True
-            scene = SiteConfig.objects.first().default_scene
-            serializer = SceneSerializer(scene)
-            
-           
-            obj = Scene.objects.get(id=scene.id)
-            try:
-                unity_scene = UnityScene.objects.get(id=obj.unity_scene.id)
-                loading_text = unity_scene.loading_text
-            except:
-                loading_text = settings.default_loading_text       
-
-            if settings.loading_image:
-                loading_image = settings.loading_image.url
-            else:
-                loading_image = None
-
-
-            data = {
-                "scene_id":serializer.data["id"],
-                "scene_title":serializer.data["title"],
-                "background_image":serializer.data["image"],
-                "loading_text":loading_text,
-                "loading_image":loading_image
-            }
-
-            response_key = 'immersive_details'
-
-        else:
-            immersive_experience = False
-            response_key = 'homepage'
-
-        response_data = {
-            "title":title,
-            "favicon":favicon,
-            "immersive_experience":immersive_experience,
-            "browse_without_login":browse_without_login,
-            response_key : data,
-            "theme_settings":theme_settings
-        }
-
-        return Response({"data":response_data})
+        # served pre-rendered, see dashboard.documents
+        response = HttpResponse(get_config_document().content, content_type='application/json')
+        patch_cache_control(response, no_cache=True)
+        return response
     
 # ---------------------------------------------------------------------------------------------------------
 # FILE LIBRARY